@@ -20,12 +20,50 @@ Existing CLI Options Used:
 """
 
 import json
+import os
+import selectors
+import shutil
 import subprocess
+import tempfile
+import threading
+import time
+import weakref
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from collections.abc import Sequence
 from dataclasses import dataclass, field
-from typing import Iterator, Iterable, Optional, Callable, Any
+from typing import AsyncIterator, Iterator, Iterable, Optional, Callable, Any, TypeVar, overload
 from enum import Enum
+from functools import lru_cache
+from types import TracebackType
+
+# orjson is an optional speedup: it parses UTF-8 bytes directly in C.
+# Its JSONDecodeError subclasses json.JSONDecodeError, so callers only
+# need to catch the stdlib exception.
+_json_loads: Callable[[bytes | str], Any]
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+# ijson is optional; it lets query() parse large results incrementally
+# (see AgentConfig.incremental_parse).
+try:
+    import ijson  # type: ignore[import-not-found]
+except ImportError:
+    ijson = None
+
+
+# Pipe buffer size for streaming subprocess output
+STREAM_BUFFER_SIZE = 64 * 1024
+
+# Seconds a CursorAgentClient.list_models() result stays cached
+MODELS_CACHE_TTL = 60.0
+
+# Max line length for asyncio subprocess readers; a single stream-json
+# line carries a whole assistant message, so the 64 KiB default is too low.
+ASYNC_STREAM_LIMIT = 16 * 1024 * 1024
 
 
 class OutputFormat(Enum):
@@ -50,7 +88,36 @@ class EventType(Enum):
     UNKNOWN = "unknown"
 
 
-@dataclass
+# Event type lookup for stream-json lines. Exact (type, subtype) matches
+# are tried first, then the per-type fallback; "assistant" is resolved
+# separately since it depends on the presence of timestamp_ms.
+_EVENT_TYPES: dict[tuple[str, Optional[str]], EventType] = {
+    ("system", "init"): EventType.SYSTEM_INIT,
+    ("thinking", "delta"): EventType.THINKING_DELTA,
+    ("result", "success"): EventType.RESULT_SUCCESS,
+}
+
+_EVENT_TYPE_FALLBACKS: dict[str, EventType] = {
+    "user": EventType.USER,
+    "thinking": EventType.THINKING_COMPLETED,
+    "result": EventType.RESULT_ERROR,
+    "tool-call-started": EventType.TOOL_CALL_STARTED,
+    "tool-call-completed": EventType.TOOL_CALL_COMPLETED,
+}
+
+
+# Events StreamingResponse always keeps, even without collect_events.
+# They carry the session ID and final result needed by finalize_stream.
+_RETAINED_EVENT_TYPES = frozenset({
+    EventType.SYSTEM_INIT,
+    EventType.RESULT_SUCCESS,
+    EventType.RESULT_ERROR,
+})
+
+_RESULT_EVENT_TYPES = frozenset({EventType.RESULT_SUCCESS, EventType.RESULT_ERROR})
+
+
+@dataclass(slots=True)
 class AgentEvent:
     """Represents an event from cursor-agent stream."""
     type: EventType
@@ -62,6 +129,94 @@ class AgentEvent:
     timestamp_ms: Optional[int] = None
 
 
+def _extract_text(data: dict) -> Optional[str]:
+    """Find the text of an event: top-level text/result, then message content."""
+    if "text" in data:
+        text = data["text"]
+        return text if isinstance(text, str) else None
+    if "result" in data:
+        text = data["result"]
+        return text if isinstance(text, str) else None
+    message = data.get("message")
+    if isinstance(message, dict):
+        content = message.get("content", [])
+        if content and isinstance(content, list):
+            for item in content:
+                if isinstance(item, dict) and item.get("type") == "text":
+                    text = item.get("text", "")
+                    return text if isinstance(text, str) else None
+    return None
+
+
+def _delta_text(data: dict) -> Optional[str]:
+    """Text of an assistant/thinking delta, usually a top-level field."""
+    text = data.get("text")
+    if text is None:
+        text = _extract_text(data)
+    return text
+
+
+_T = TypeVar("_T")
+
+
+class _ListView(Sequence[_T]):
+    """Read-only, zero-copy view over a list owned by another object."""
+    
+    __slots__ = ("_items",)
+    
+    def __init__(self, items: Sequence[_T]):
+        self._items = items
+    
+    @overload
+    def __getitem__(self, index: int) -> _T: ...
+    @overload
+    def __getitem__(self, index: slice) -> list[_T]: ...
+    def __getitem__(self, index: int | slice) -> _T | Sequence[_T]:
+        return self._items[index]
+    
+    def __len__(self) -> int:
+        return len(self._items)
+    
+    def __iter__(self) -> Iterator[_T]:
+        return iter(self._items)
+    
+    def __reversed__(self) -> Iterator[_T]:
+        return reversed(self._items)
+    
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, _ListView):
+            other = other._items
+        return self._items == other
+    
+    def __repr__(self) -> str:
+        return repr(self._items)
+
+
+class _DequeView(_ListView[_T]):
+    """_ListView over a deque, which supports neither slicing nor == with lists."""
+    
+    __slots__ = ()
+    
+    @overload
+    def __getitem__(self, index: int) -> _T: ...
+    @overload
+    def __getitem__(self, index: slice) -> list[_T]: ...
+    def __getitem__(self, index: int | slice) -> _T | list[_T]:
+        if isinstance(index, slice):
+            return list(self._items)[index]
+        return self._items[index]
+    
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, _ListView):
+            other = other._items
+        if not isinstance(other, (list, deque)):
+            return NotImplemented
+        return list(self._items) == list(other)
+    
+    def __repr__(self) -> str:
+        return repr(list(self._items))
+
+
 class StreamingResponse:
     """
     Wrapper for streaming responses that supports cancellation.
@@ -79,41 +234,194 @@ class StreamingResponse:
                 break
     """
     
-    def __init__(self, process: subprocess.Popen, parse_event: Callable[[str], Optional[AgentEvent]]):
+    def __init__(
+        self,
+        process: subprocess.Popen,
+        parse_event: Callable[[bytes], Optional[AgentEvent]],
+        collect_events: bool = False,
+        read_timeout: Optional[float] = None,
+        event_from_data: Optional[Callable[[dict], AgentEvent]] = None,
+    ):
         self._process = process
         self._parse_event = parse_event
+        # Builds an event from an already decoded line (see _collect_text)
+        self._event_from_data = event_from_data
+        self._collect_events = collect_events
+        self._read_timeout = read_timeout
         self._cancelled = False
         self._events: list[AgentEvent] = []
+        # The list is only ever appended to, so one live view serves all
+        self._events_view = _ListView(self._events)
+        # Read-ahead state for _read_fd_lines, kept across passes
+        self._ready_lines: deque[bytes] = deque()
+        self._pending_line: list[bytes] = []
+        self._stdout_eof = False
+    
+    def _read_lines(self) -> Iterator[bytes]:
+        """
+        Yield raw lines from stdout.
+        
+        Real pipes are drained with os.read() in STREAM_BUFFER_SIZE chunks
+        and split in C, so a burst of small deltas costs one syscall instead
+        of one readline() each. File-like objects without a descriptor
+        (e.g. in tests) are iterated line by line.
+        
+        If read_timeout is set, each read waits for data via a selector and
+        the stream is cancelled with TimeoutError once the agent has been
+        silent for that long.
+        """
+        stdout = self._process.stdout
+        if stdout is None:
+            return
+        try:
+            fd = stdout.fileno()
+        except (AttributeError, OSError, ValueError):
+            yield from stdout
+            return
+        
+        selector = None
+        if self._read_timeout is not None:
+            selector = selectors.DefaultSelector()
+            selector.register(fd, selectors.EVENT_READ)
+        try:
+            yield from self._read_fd_lines(fd, selector)
+        finally:
+            if selector is not None:
+                selector.close()
+    
+    def _read_fd_lines(
+        self, fd: int, selector: Optional[selectors.BaseSelector]
+    ) -> Iterator[bytes]:
+        """
+        Split os.read() chunks from fd into lines (see _read_lines).
+        
+        Lines read but not yet handed out, and the start of a line that
+        spans several reads, live on the instance rather than in this
+        generator, so a later pass (after a break, or collect_text() or
+        finalize_stream() following a partial loop) picks up exactly
+        where the previous one stopped.
+        """
+        ready = self._ready_lines
+        pending = self._pending_line
+        while True:
+            while ready:
+                yield ready.popleft()
+            if self._stdout_eof:
+                return
+            if selector is not None and not selector.select(self._read_timeout):
+                self.cancel()
+                raise TimeoutError(
+                    f"No output from cursor-agent for {self._read_timeout} seconds"
+                )
+            chunk = os.read(fd, STREAM_BUFFER_SIZE)
+            if not chunk:
+                self._stdout_eof = True
+                if pending:
+                    ready.append(b"".join(pending))
+                    pending.clear()
+                continue
+            if b"\n" not in chunk:
+                pending.append(chunk)
+                continue
+            if pending:
+                pending.append(chunk)
+                chunk = b"".join(pending)
+                pending.clear()
+            lines = chunk.split(b"\n")
+            tail = lines.pop()
+            if tail:
+                pending.append(tail)
+            ready.extend(lines)
     
     def __iter__(self) -> Iterator[AgentEvent]:
         """Iterate over events from the stream."""
         if self._process.stdout:
-            for line in self._process.stdout:
+            # Lines go to the parser as raw bytes; json.loads decodes them
+            # in a single pass.
+            for line in self._read_lines():
                 if self._cancelled:
                     break
                 line = line.strip()
                 if line:
                     event = self._parse_event(line)
                     if event:
-                        self._events.append(event)
+                        if self._collect_events or event.type in _RETAINED_EVENT_TYPES:
+                            self._events.append(event)
                         yield event
         
         if not self._cancelled:
             self._process.wait()
     
-    def cancel(self, signal: int = 15) -> None:
+    def _collect_text(self, include_thinking: bool) -> str:
+        """
+        collect_text() for a stream that has not been consumed yet.
+        
+        Deltas are the bulk of a stream and only their text is wanted, so
+        they are decoded straight into the buffer without building an
+        AgentEvent each. Every other line goes through the regular parser,
+        so retained events and the RESULT_SUCCESS fallback behave as if
+        the stream had been iterated.
+        """
+        if (
+            self._event_from_data is None
+            or self._collect_events
+            or not self._process.stdout
+        ):
+            return _collect_event_text(self, include_thinking)
+        
+        parts: list[str] = []
+        for line in self._read_lines():
+            if self._cancelled:
+                break
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                data = _json_loads(line)
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                continue
+            
+            raw_type = data.get("type")
+            if raw_type == "assistant" and "timestamp_ms" in data:
+                text = _delta_text(data)
+                if text:
+                    parts.append(text)
+                continue
+            if raw_type == "thinking" and data.get("subtype") == "delta":
+                if include_thinking:
+                    text = _delta_text(data)
+                    if text:
+                        parts.append(f"[thinking: {text}]")
+                continue
+            
+            event = self._event_from_data(data)
+            if event.type in _RETAINED_EVENT_TYPES:
+                self._events.append(event)
+            if event.type is EventType.RESULT_SUCCESS:
+                # Use the final result instead if no deltas were collected
+                if not parts and event.text:
+                    return event.text
+        
+        if not self._cancelled:
+            self._process.wait()
+        return "".join(parts)
+    
+    def cancel(self, signal: int = 15, timeout: float = 2.0) -> None:
         """
         Cancel the ongoing generation.
         
         Args:
             signal: Signal to send to the process (default: SIGTERM=15)
                    Use signal=9 for SIGKILL if SIGTERM doesn't work.
+            timeout: Seconds to wait for the process to exit after the
+                   signal before killing it, bounding how long cancel()
+                   can block.
         """
         if not self._cancelled and self._process.poll() is None:
             self._cancelled = True
             try:
                 self._process.send_signal(signal)
-                self._process.wait(timeout=2)
+                self._process.wait(timeout=timeout)
             except subprocess.TimeoutExpired:
                 self._process.kill()
                 self._process.wait()
@@ -124,9 +432,16 @@ class StreamingResponse:
         return self._cancelled
     
     @property
-    def events(self) -> list[AgentEvent]:
-        """List of events received so far."""
-        return self._events.copy()
+    def events(self) -> Sequence[AgentEvent]:
+        """
+        Read-only view of events received so far (not a copy).
+        
+        Only SYSTEM_INIT and RESULT_* events are retained unless the stream
+        was created with collect_events=True. The same view is returned on
+        every access and stays current as the stream is consumed, so there
+        is no need to keep a separate list(stream) as well.
+        """
+        return self._events_view
     
     @property
     def process(self) -> subprocess.Popen:
@@ -142,7 +457,7 @@ class StreamingResponse:
             self.cancel()
 
 
-@dataclass
+@dataclass(slots=True)
 class AgentResult:
     """Result from a cursor-agent query."""
     success: bool
@@ -155,16 +470,60 @@ class AgentResult:
     events: list[AgentEvent] = field(default_factory=list)
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class AgentConfig:
-    """Configuration for cursor-agent client."""
+    """
+    Configuration for cursor-agent client.
+    
+    Frozen so the client can build the config-derived command line once;
+    use dataclasses.replace() to derive a modified config. headers may be
+    given as any sequence and is stored as a tuple, so it cannot be
+    changed in place behind the client's back either.
+    """
     workspace: Optional[str] = None
     model: Optional[str] = None
     force_approve: bool = False
     approve_mcps: bool = False
     api_key: Optional[str] = None
-    headers: list[str] = field(default_factory=list)
+    headers: tuple[str, ...] = ()
     agent_binary: str = "agent"
+    keep_raw_data: bool = True  # Set False to drop AgentEvent.data (and share payload-free events)
+    fast_spawn: bool = True  # Spawn with close_fds=False (only inheritable fds are passed on)
+    incremental_parse: bool = False  # Parse query() output as it streams in (needs ijson)
+    
+    def __post_init__(self) -> None:
+        object.__setattr__(self, "headers", tuple(self.headers))
+
+
+@lru_cache(maxsize=32)
+def _argv_for(config: AgentConfig, binary: str) -> tuple[str, ...]:
+    """
+    Build the config-derived part of the command line.
+    
+    Cached per (config, binary), so clients sharing an equal config reuse
+    one immutable tuple and each query only copies it into a new list.
+    """
+    cmd = [binary, "--print"]
+    
+    if config.workspace:
+        cmd.extend(["--workspace", config.workspace])
+    
+    if config.model:
+        cmd.extend(["--model", config.model])
+    
+    if config.force_approve:
+        cmd.append("-f")
+    
+    if config.approve_mcps:
+        cmd.append("--approve-mcps")
+    
+    if config.api_key:
+        cmd.extend(["--api-key", config.api_key])
+    
+    for header in config.headers:
+        cmd.extend(["-H", header])
+    
+    return tuple(cmd)
 
 
 class CursorAgentClient:
@@ -187,10 +546,67 @@ class CursorAgentClient:
         for event in client.query_stream("Explain Python generators"):
             if event.type == EventType.ASSISTANT:
                 print(event.text, end="", flush=True)
+    
+    With pool_size > 0 the client keeps that many agent processes started
+    and waiting for a prompt, so a fresh query() (no session_id or mode)
+    skips the CLI's startup time. Each claimed process is replaced right
+    away. Use the client as a context manager, or call close(), to stop
+    the spare processes.
+    
+        with CursorAgentClient(pool_size=2) as client:
+            results = [client.query(p) for p in prompts]
     """
     
-    def __init__(self, config: Optional[AgentConfig] = None):
+    # list_models() results: (agent_binary, api_key) -> (monotonic time, models)
+    _models_cache: dict[tuple[str, Optional[str]], tuple[float, list[str]]] = {}
+    # Resolved agent binaries: (agent_binary, PATH) -> absolute path
+    _binary_paths: dict[tuple[str, Optional[str]], str] = {}
+    
+    def __init__(self, config: Optional[AgentConfig] = None, pool_size: int = 0):
+        # Pre-started json-mode processes for fresh queries, see query()
+        self._pool_size = pool_size
+        self._warm_pool: list[subprocess.Popen] = []
+        self._pool_lock = threading.Lock()
+        if pool_size:
+            # Spare processes must not outlive a client that was never closed
+            weakref.finalize(self, self._stop_processes, self._warm_pool)
         self.config = config or AgentConfig()
+        # Shared payload-free UNKNOWN events, see _parse_event
+        self._unknown_events: dict[tuple[str, Optional[str]], AgentEvent] = {}
+    
+    @property
+    def config(self) -> AgentConfig:
+        return self._config
+    
+    @config.setter
+    def config(self, config: AgentConfig) -> None:
+        self._config = config
+        self._binary = self._resolve_binary(config.agent_binary)
+        # With close_fds=False and an absolute binary path, subprocess can
+        # use posix_spawn/vfork instead of fork + closing every inherited fd.
+        self._close_fds = not config.fast_spawn
+        self._base_cmd = _argv_for(config, self._binary)
+        # Pooled processes were started with the old command line
+        self._drain_warm_pool()
+        self._fill_warm_pool()
+    
+    @classmethod
+    def _resolve_binary(cls, binary: str) -> str:
+        """
+        Resolve binary against PATH, once per process rather than per client.
+        
+        Hits are shared by all clients until PATH changes. A binary that is
+        not found is left as-is (and not cached) so exec reports the usual
+        error and a later install is picked up.
+        """
+        key = (binary, os.environ.get("PATH"))
+        path = cls._binary_paths.get(key)
+        if path is None:
+            path = shutil.which(binary)
+            if path is None:
+                return binary
+            cls._binary_paths[key] = path
+        return path
     
     def _build_command(
         self,
@@ -201,85 +617,76 @@ class CursorAgentClient:
         mode: Optional[str] = None,
     ) -> list[str]:
         """Build the command line arguments for cursor-agent."""
-        cmd = [self.config.agent_binary, "--print"]
+        cmd = list(self._base_cmd)
         
-        cmd.extend(["--output-format", output_format.value])
+        cmd.extend(("--output-format", output_format.value))
         
-        if stream_partial and output_format == OutputFormat.STREAM_JSON:
+        if stream_partial and output_format is OutputFormat.STREAM_JSON:
             cmd.append("--stream-partial-output")
         
         if session_id:
-            cmd.extend(["--resume", session_id])
-        
-        if self.config.workspace:
-            cmd.extend(["--workspace", self.config.workspace])
-        
-        if self.config.model:
-            cmd.extend(["--model", self.config.model])
-        
-        if self.config.force_approve:
-            cmd.append("-f")
-        
-        if self.config.approve_mcps:
-            cmd.append("--approve-mcps")
-        
-        if self.config.api_key:
-            cmd.extend(["--api-key", self.config.api_key])
-        
-        for header in self.config.headers:
-            cmd.extend(["-H", header])
+            cmd.extend(("--resume", session_id))
         
         if mode:
-            cmd.extend(["--mode", mode])
+            cmd.extend(("--mode", mode))
         
         # Prompt is passed via stdin, not as argument
         return cmd
     
-    def _parse_event(self, line: str) -> Optional[AgentEvent]:
-        """Parse a JSON line into an AgentEvent."""
+    def _parse_event(self, line: str | bytes) -> Optional[AgentEvent]:
+        """Parse a JSON line (str or UTF-8 bytes) into an AgentEvent."""
         try:
-            data = json.loads(line.strip())
-        except json.JSONDecodeError:
+            data = _json_loads(line)
+        except (json.JSONDecodeError, UnicodeDecodeError):
             return None
-        
+        return self._event_from_data(data)
+    
+    def _event_from_data(self, data: dict) -> AgentEvent:
+        """Build an AgentEvent from a decoded event line."""
         raw_type = data.get("type", "unknown")
         subtype = data.get("subtype")
         
         # Determine event type
-        if raw_type == "system" and subtype == "init":
-            event_type = EventType.SYSTEM_INIT
-        elif raw_type == "user":
-            event_type = EventType.USER
-        elif raw_type == "thinking":
-            event_type = EventType.THINKING_DELTA if subtype == "delta" else EventType.THINKING_COMPLETED
-        elif raw_type == "assistant":
+        if raw_type == "assistant":
             # In streaming mode, partial messages have timestamp_ms, final doesn't
             if "timestamp_ms" in data:
                 event_type = EventType.ASSISTANT_DELTA
             else:
                 event_type = EventType.ASSISTANT
-        elif raw_type == "result":
-            event_type = EventType.RESULT_SUCCESS if subtype == "success" else EventType.RESULT_ERROR
-        elif raw_type == "tool-call-started":
-            event_type = EventType.TOOL_CALL_STARTED
-        elif raw_type == "tool-call-completed":
-            event_type = EventType.TOOL_CALL_COMPLETED
         else:
-            event_type = EventType.UNKNOWN
-        
-        # Extract text content
-        text = None
-        if "text" in data:
-            text = data["text"]
-        elif "result" in data:
-            text = data["result"]
-        elif "message" in data and isinstance(data["message"], dict):
-            content = data["message"].get("content", [])
-            if content and isinstance(content, list):
-                for item in content:
-                    if isinstance(item, dict) and item.get("type") == "text":
-                        text = item.get("text", "")
-                        break
+            event_type = _EVENT_TYPES.get((raw_type, subtype)) or _EVENT_TYPE_FALLBACKS.get(
+                raw_type, EventType.UNKNOWN
+            )
+        
+        # Extract text content. Deltas (the bulk of a stream) and results
+        # keep their text in a fixed top-level field; everything else goes
+        # through the generic lookup.
+        if event_type is EventType.ASSISTANT_DELTA or event_type is EventType.THINKING_DELTA:
+            text = _delta_text(data)
+        elif event_type is EventType.RESULT_SUCCESS or event_type is EventType.RESULT_ERROR:
+            text = data.get("result")
+        else:
+            text = _extract_text(data)
+        
+        session_id = data.get("session_id")
+        timestamp_ms = data.get("timestamp_ms")
+        
+        if not self.config.keep_raw_data:
+            # Payload-free unknown events (heartbeats and the like) are all
+            # identical once data is dropped, so share one instance each.
+            if (
+                event_type is EventType.UNKNOWN
+                and text is None
+                and session_id is None
+                and timestamp_ms is None
+            ):
+                key = (raw_type, subtype)
+                event = self._unknown_events.get(key)
+                if event is None:
+                    event = AgentEvent(type=event_type, raw_type=raw_type, subtype=subtype, data={})
+                    self._unknown_events[key] = event
+                return event
+            data = {}
         
         return AgentEvent(
             type=event_type,
@@ -287,10 +694,140 @@ class CursorAgentClient:
             subtype=subtype,
             data=data,
             text=text,
-            session_id=data.get("session_id"),
-            timestamp_ms=data.get("timestamp_ms"),
+            session_id=session_id,
+            timestamp_ms=timestamp_ms,
         )
     
+    def _parse_result(
+        self,
+        returncode: int,
+        stdout: bytes,
+        stderr: bytes,
+        session_id: Optional[str] = None,
+    ) -> AgentResult:
+        """
+        Build an AgentResult from a finished json-mode invocation.
+        
+        stdout is parsed straight from bytes; output is only decoded to
+        str when it has to be reported in an error.
+        """
+        if returncode != 0:
+            return AgentResult(
+                success=False,
+                result="",
+                session_id=session_id or "",
+                error=stderr.decode("utf-8", errors="replace") or f"Exit code: {returncode}",
+            )
+        
+        # Parse the JSON response
+        try:
+            data = _json_loads(stdout)
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            return AgentResult(
+                success=False,
+                result=stdout.decode("utf-8", errors="replace"),
+                session_id=session_id or "",
+                error=f"Failed to parse JSON: {e}",
+            )
+        return self._result_from_data(data)
+    
+    @staticmethod
+    def _result_from_data(data: dict) -> AgentResult:
+        """Build an AgentResult from a parsed json-mode result object."""
+        return AgentResult(
+            success=data.get("subtype") == "success",
+            result=data.get("result", ""),
+            session_id=data.get("session_id", ""),
+            request_id=data.get("request_id"),
+            duration_ms=data.get("duration_ms"),
+            duration_api_ms=data.get("duration_api_ms"),
+            error=data.get("error") if data.get("is_error") else None,
+        )
+    
+    def _query_incremental(
+        self,
+        cmd: list[str],
+        prompt: str,
+        timeout: Optional[int] = None,
+        session_id: Optional[str] = None,
+    ) -> AgentResult:
+        """
+        Run a json-mode query, parsing stdout with ijson as it arrives.
+        
+        Only the parsed fields are held in memory, never the raw output as
+        well, which roughly halves peak memory for very large results.
+        Raises subprocess.TimeoutExpired like subprocess.run().
+        """
+        timed_out = threading.Event()
+        
+        def on_timeout() -> None:
+            timed_out.set()
+            process.kill()
+        
+        # stderr goes to a file so a chatty agent cannot fill the pipe and
+        # stall while we are blocked reading stdout
+        with tempfile.TemporaryFile() as stderr_file:
+            process = subprocess.Popen(
+                cmd,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=stderr_file,
+                bufsize=STREAM_BUFFER_SIZE,
+                close_fds=self._close_fds,
+            )
+            timer = threading.Timer(timeout, on_timeout) if timeout is not None else None
+            if timer is not None:
+                timer.start()
+            
+            data: dict = {}
+            parse_error = None
+            try:
+                if process.stdin:
+                    try:
+                        process.stdin.write(prompt.encode("utf-8"))
+                        process.stdin.close()
+                    except BrokenPipeError:
+                        # Agent exited without reading; report its exit code
+                        pass
+                try:
+                    for key, value in ijson.kvitems(process.stdout, "", use_float=True):
+                        data[key] = value
+                except ijson.JSONError as e:
+                    parse_error = e
+                returncode = process.wait()
+            finally:
+                if timer is not None:
+                    timer.cancel()
+                if process.poll() is None:
+                    process.kill()
+                    process.wait()
+                if process.stdout:
+                    process.stdout.close()
+            
+            if timed_out.is_set():
+                # Only the timer sets timed_out, and it exists only with a timeout
+                assert timeout is not None
+                raise subprocess.TimeoutExpired(cmd, timeout)
+            
+            if returncode != 0:
+                stderr_file.seek(0)
+                stderr = stderr_file.read()
+                return AgentResult(
+                    success=False,
+                    result="",
+                    session_id=session_id or "",
+                    error=stderr.decode("utf-8", errors="replace") or f"Exit code: {returncode}",
+                )
+        
+        if parse_error is not None:
+            return AgentResult(
+                success=False,
+                result="",
+                session_id=session_id or "",
+                error=f"Failed to parse JSON: {parse_error}",
+            )
+        return self._result_from_data(data)
+    
     def query(
         self,
         prompt: str,
@@ -310,6 +847,11 @@ class CursorAgentClient:
         Returns:
             AgentResult with the response
         """
+        if session_id is None and mode is None and not self.config.incremental_parse:
+            process = self._claim_pooled_process()
+            if process is not None:
+                return self._finish_query(process, prompt, timeout)
+        
         cmd = self._build_command(
             prompt, 
             session_id=session_id, 
@@ -318,41 +860,20 @@ class CursorAgentClient:
         )
         
         try:
+            if self.config.incremental_parse and ijson is not None:
+                return self._query_incremental(cmd, prompt, timeout, session_id)
+            
             result = subprocess.run(
                 cmd,
-                input=prompt,
+                input=prompt.encode("utf-8"),
                 capture_output=True,
-                text=True,
                 timeout=timeout,
+                close_fds=self._close_fds,
             )
             
-            if result.returncode != 0:
-                return AgentResult(
-                    success=False,
-                    result="",
-                    session_id=session_id or "",
-                    error=result.stderr or f"Exit code: {result.returncode}",
-                )
-            
-            # Parse the JSON response
-            try:
-                data = json.loads(result.stdout.strip())
-                return AgentResult(
-                    success=data.get("subtype") == "success",
-                    result=data.get("result", ""),
-                    session_id=data.get("session_id", ""),
-                    request_id=data.get("request_id"),
-                    duration_ms=data.get("duration_ms"),
-                    duration_api_ms=data.get("duration_api_ms"),
-                    error=data.get("error") if data.get("is_error") else None,
-                )
-            except json.JSONDecodeError as e:
-                return AgentResult(
-                    success=False,
-                    result=result.stdout,
-                    session_id=session_id or "",
-                    error=f"Failed to parse JSON: {e}",
-                )
+            return self._parse_result(
+                result.returncode, result.stdout, result.stderr, session_id
+            )
         except subprocess.TimeoutExpired:
             return AgentResult(
                 success=False,
@@ -368,12 +889,131 @@ class CursorAgentClient:
                 error=str(e),
             )
     
+    def _claim_pooled_process(self) -> Optional[subprocess.Popen]:
+        """Take a live process from the warm pool and start its replacement."""
+        process = None
+        exited = []
+        with self._pool_lock:
+            while self._warm_pool:
+                candidate = self._warm_pool.pop()
+                if candidate.poll() is None:
+                    process = candidate
+                    break
+                exited.append(candidate)
+        self._stop_processes(exited)
+        self._fill_warm_pool()
+        return process
+    
+    def _fill_warm_pool(self) -> None:
+        """Start processes until the warm pool holds pool_size of them."""
+        with self._pool_lock:
+            while len(self._warm_pool) < self._pool_size:
+                try:
+                    self._warm_pool.append(self._start_query())
+                except OSError:
+                    # Best effort: queries spawn normally instead
+                    return
+    
+    def _drain_warm_pool(self) -> None:
+        """Stop every pooled process."""
+        with self._pool_lock:
+            processes = self._warm_pool[:]
+            # Cleared in place: the finalizer holds this same list
+            self._warm_pool.clear()
+        self._stop_processes(processes)
+    
+    @staticmethod
+    def _stop_processes(processes: list[subprocess.Popen]) -> None:
+        """Kill and reap processes that never received a prompt."""
+        for process in processes:
+            if process.poll() is None:
+                process.kill()
+            process.communicate()
+    
+    def close(self) -> None:
+        """Stop the pre-started processes, if any."""
+        self._pool_size = 0
+        self._drain_warm_pool()
+    
+    def __enter__(self) -> "CursorAgentClient":
+        return self
+    
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_val: BaseException | None,
+        exc_tb: TracebackType | None,
+    ) -> None:
+        self.close()
+    
+    def _spawn(self, cmd: list[str]) -> subprocess.Popen:
+        """Start cursor-agent with all three standard streams piped."""
+        # Binary pipes with a large buffer: fewer read() syscalls and no
+        # TextIOWrapper decoding on the per-line hot path.
+        return subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            bufsize=STREAM_BUFFER_SIZE,
+            close_fds=self._close_fds,
+        )
+    
+    def _start_query(
+        self,
+        session_id: Optional[str] = None,
+        mode: Optional[str] = None,
+    ) -> subprocess.Popen:
+        """
+        Launch a json-mode query ahead of time.
+        
+        The process starts up and then blocks reading its prompt from
+        stdin; hand it to _finish_query() to send the prompt.
+        """
+        cmd = self._build_command(
+            "",
+            session_id=session_id,
+            output_format=OutputFormat.JSON,
+            mode=mode,
+        )
+        return self._spawn(cmd)
+    
+    def _finish_query(
+        self,
+        process: subprocess.Popen,
+        prompt: str,
+        timeout: Optional[int] = None,
+        session_id: Optional[str] = None,
+    ) -> AgentResult:
+        """Send the prompt to a process from _start_query() and collect its result."""
+        try:
+            stdout, stderr = process.communicate(prompt.encode("utf-8"), timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+            return AgentResult(
+                success=False,
+                result="",
+                session_id=session_id or "",
+                error="Request timed out",
+            )
+        except Exception as e:
+            return AgentResult(
+                success=False,
+                result="",
+                session_id=session_id or "",
+                error=str(e),
+            )
+        return self._parse_result(process.returncode, stdout, stderr, session_id)
+    
     def query_stream(
         self,
         prompt: str,
         session_id: Optional[str] = None,
         stream_partial: bool = True,
         mode: Optional[str] = None,
+        collect_events: bool = False,
+        read_timeout: Optional[float] = None,
     ) -> StreamingResponse:
         """
         Send a query to cursor-agent and stream events.
@@ -383,6 +1023,10 @@ class CursorAgentClient:
             session_id: Optional session ID to resume a conversation
             stream_partial: Whether to stream partial text deltas
             mode: Optional mode ('plan' or 'ask')
+            collect_events: Keep every event in StreamingResponse.events
+                (by default only init and result events are kept)
+            read_timeout: Optional seconds to wait for output before the
+                stream is cancelled and iteration raises TimeoutError
         
         Returns:
             StreamingResponse that can be iterated over and cancelled.
@@ -413,39 +1057,61 @@ class CursorAgentClient:
             mode=mode,
         )
         
-        process = subprocess.Popen(
-            cmd,
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-        )
+        process = self._spawn(cmd)
         
-        # Send prompt
+        # Send prompt. The pipe is binary, so the prompt is encoded exactly
+        # once; writes larger than the pipe buffer go straight to the fd,
+        # which makes manual chunking unnecessary.
         if process.stdin:
-            process.stdin.write(prompt)
+            process.stdin.write(prompt.encode("utf-8"))
             process.stdin.close()
         
-        return StreamingResponse(process, self._parse_event)
+        return StreamingResponse(
+            process,
+            self._parse_event,
+            collect_events=collect_events,
+            read_timeout=read_timeout,
+            event_from_data=self._event_from_data,
+        )
     
     def create_session(self) -> str:
         """Create a new empty chat session and return its ID."""
         result = subprocess.run(
-            [self.config.agent_binary, "create-chat"],
+            [self._binary, "create-chat"],
             capture_output=True,
             text=True,
+            close_fds=self._close_fds,
         )
         return result.stdout.strip()
     
     def list_models(self) -> list[str]:
-        """List available models."""
+        """
+        List available models.
+        
+        Successful results are cached for MODELS_CACHE_TTL seconds per
+        (agent_binary, api_key), shared across clients.
+        """
+        key = (self.config.agent_binary, self.config.api_key)
+        cached = CursorAgentClient._models_cache.get(key)
+        if cached is not None and time.monotonic() - cached[0] < MODELS_CACHE_TTL:
+            return list(cached[1])
+        
         result = subprocess.run(
-            [self.config.agent_binary, "--list-models"],
+            [self._binary, "--list-models"],
             capture_output=True,
             text=True,
+            close_fds=self._close_fds,
         )
         # Parse the output - it's typically a list of model names
-        return [line.strip() for line in result.stdout.strip().split("\n") if line.strip()]
+        models = [line.strip() for line in result.stdout.strip().split("\n") if line.strip()]
+        if result.returncode == 0:
+            CursorAgentClient._models_cache[key] = (time.monotonic(), models)
+        return list(models)
+    
+    @classmethod
+    def invalidate_models_cache(cls) -> None:
+        """Drop cached list_models() results."""
+        cls._models_cache.clear()
 
 
 class ConversationSession:
@@ -460,24 +1126,44 @@ class ConversationSession:
         
         response2 = session.send("What's my name?")
         print(response2.result)  # Should mention Alice
+    
+    With history_limit set, only the most recent history_limit turns are
+    kept in history (older ones are dropped as new ones arrive); the agent
+    itself still remembers the whole session.
+    
+    With prewarm=True, each send() launches the agent process for the next
+    turn right away (resuming the same session), so its startup overlaps
+    the time spent between turns. Use the session as a context manager,
+    or call close(), to stop the spare process.
+    
+        with ConversationSession(prewarm=True) as session:
+            session.send("Hello")
+            session.send("Tell me more")  # Reuses the pre-started process
     """
     
     def __init__(
         self,
         client: Optional[CursorAgentClient] = None,
         session_id: Optional[str] = None,
+        prewarm: bool = False,
+        history_limit: Optional[int] = None,
     ):
         self.client = client or CursorAgentClient()
         self._session_id = session_id
-        self._history: list[tuple[str, AgentResult]] = []
+        self._history_limit = history_limit
+        self._history: deque[tuple[str, AgentResult]] = deque(maxlen=history_limit)
+        self._prewarm = prewarm
+        self._warm_process: Optional[subprocess.Popen] = None
+        self._warm_key: Optional[tuple[Optional[str], Optional[str]]] = None
     
     @property
     def session_id(self) -> Optional[str]:
         return self._session_id
     
     @property
-    def history(self) -> list[tuple[str, AgentResult]]:
-        return self._history.copy()
+    def history(self) -> Sequence[tuple[str, AgentResult]]:
+        """Read-only view of (prompt, result) pairs (not a copy)."""
+        return _DequeView(self._history)
     
     def send(
         self,
@@ -486,25 +1172,79 @@ class ConversationSession:
         mode: Optional[str] = None,
     ) -> AgentResult:
         """Send a message and get a response."""
-        result = self.client.query(
-            prompt,
-            session_id=self._session_id,
-            timeout=timeout,
-            mode=mode,
-        )
+        process = self._claim_warm_process(mode)
+        if process is not None:
+            result = self.client._finish_query(process, prompt, timeout, self._session_id)
+        else:
+            result = self.client.query(
+                prompt,
+                session_id=self._session_id,
+                timeout=timeout,
+                mode=mode,
+            )
         
         # Update session ID from response
         if result.session_id:
             self._session_id = result.session_id
         
         self._history.append((prompt, result))
+        
+        if self._prewarm and self._session_id:
+            self._start_warm_process(mode)
         return result
     
+    def _start_warm_process(self, mode: Optional[str]) -> None:
+        """Pre-start the next turn's process, assuming it uses the same mode."""
+        self._discard_warm_process()
+        try:
+            self._warm_process = self.client._start_query(self._session_id, mode)
+        except OSError:
+            # Best effort: the next send() spawns normally instead
+            return
+        self._warm_key = (self._session_id, mode)
+    
+    def _claim_warm_process(self, mode: Optional[str]) -> Optional[subprocess.Popen]:
+        """Take the pre-started process if it matches this turn, else drop it."""
+        process = self._warm_process
+        if process is None:
+            return None
+        if self._warm_key == (self._session_id, mode) and process.poll() is None:
+            self._warm_process = None
+            self._warm_key = None
+            return process
+        self._discard_warm_process()
+        return None
+    
+    def _discard_warm_process(self) -> None:
+        process = self._warm_process
+        self._warm_process = None
+        self._warm_key = None
+        if process is not None and process.poll() is None:
+            process.kill()
+            process.communicate()
+    
+    def close(self) -> None:
+        """Stop the pre-started process, if any."""
+        self._discard_warm_process()
+    
+    def __enter__(self) -> "ConversationSession":
+        return self
+    
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_val: BaseException | None,
+        exc_tb: TracebackType | None,
+    ) -> None:
+        self.close()
+    
     def send_stream(
         self,
         prompt: str,
         stream_partial: bool = True,
         mode: Optional[str] = None,
+        collect_events: bool = False,
+        read_timeout: Optional[float] = None,
     ) -> StreamingResponse:
         """
         Send a message and stream the response.
@@ -524,11 +1264,15 @@ class ConversationSession:
                     break
             session.finalize_stream(prompt, stream)
         """
+        # A process pre-started before this turn would resume stale state
+        self._discard_warm_process()
         return self.client.query_stream(
             prompt,
             session_id=self._session_id,
             stream_partial=stream_partial,
             mode=mode,
+            collect_events=collect_events,
+            read_timeout=read_timeout,
         )
     
     def finalize_stream(self, prompt: str, stream: StreamingResponse) -> Optional[AgentResult]:
@@ -547,22 +1291,27 @@ class ConversationSession:
         """
         events = stream.events
         
-        # Update session ID from any event that has it
-        for event in events:
-            if event.session_id:
-                self._session_id = event.session_id
+        # One backward pass finds both the latest session ID and the final
+        # result event, stopping as soon as it has both.
+        session_id = None
+        result_event = None
+        for event in reversed(events):
+            if session_id is None and event.session_id:
+                session_id = event.session_id
+            if result_event is None and event.type in _RESULT_EVENT_TYPES:
+                result_event = event
+            if session_id is not None and result_event is not None:
+                break
+        if session_id:
+            self._session_id = session_id
         
         # Reconstruct result from events for history
-        result_event = next(
-            (e for e in reversed(events) if e.type in (EventType.RESULT_SUCCESS, EventType.RESULT_ERROR)),
-            None
-        )
         if result_event:
             result = AgentResult(
-                success=result_event.type == EventType.RESULT_SUCCESS,
+                success=result_event.type is EventType.RESULT_SUCCESS,
                 result=result_event.text or "",
                 session_id=self._session_id or "",
-                events=events,
+                events=list(events),
             )
             self._history.append((prompt, result))
             return result
@@ -570,13 +1319,19 @@ class ConversationSession:
     
     def reset(self):
         """Start a new session."""
+        self._discard_warm_process()
         self._session_id = None
-        self._history = []
+        self._history = deque(maxlen=self._history_limit)
 
 
 class AsyncCursorAgentClient:
     """
-    Async wrapper for CursorAgentClient.
+    Async client for cursor-agent CLI.
+    
+    Queries run as asyncio subprocesses, so any number of them can be in
+    flight at once without tying up threads. Each query is its own agent
+    process: `--print` mode reads exactly one prompt from stdin, so
+    concurrent prompts cannot be coalesced into a single invocation.
     
     Example:
         async def main():
@@ -587,7 +1342,27 @@ class AsyncCursorAgentClient:
     
     def __init__(self, config: Optional[AgentConfig] = None):
         self._sync_client = CursorAgentClient(config)
-        self._executor = ThreadPoolExecutor(max_workers=4)
+    
+    async def _spawn(self, cmd: list[str]) -> asyncio.subprocess.Process:
+        """Start cursor-agent with all three standard streams piped."""
+        return await asyncio.create_subprocess_exec(
+            *cmd,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            limit=ASYNC_STREAM_LIMIT,
+            close_fds=self._sync_client._close_fds,
+        )
+    
+    @staticmethod
+    async def _reap(process: asyncio.subprocess.Process) -> None:
+        """Kill the process if it is still running (timeout or cancellation)."""
+        if process.returncode is None:
+            try:
+                process.kill()
+            except ProcessLookupError:
+                pass
+            await process.wait()
     
     async def query(
         self,
@@ -597,11 +1372,87 @@ class AsyncCursorAgentClient:
         mode: Optional[str] = None,
     ) -> AgentResult:
         """Async version of query."""
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(
-            self._executor,
-            lambda: self._sync_client.query(prompt, session_id, timeout, mode)
+        cmd = self._sync_client._build_command(
+            prompt,
+            session_id=session_id,
+            output_format=OutputFormat.JSON,
+            mode=mode,
+        )
+        
+        process = None
+        try:
+            process = await self._spawn(cmd)
+            stdout, stderr = await asyncio.wait_for(
+                process.communicate(prompt.encode("utf-8")), timeout
+            )
+            # communicate() has reaped the process, so this returns at once
+            returncode = await process.wait()
+            return self._sync_client._parse_result(
+                returncode, stdout, stderr, session_id
+            )
+        except asyncio.TimeoutError:
+            return AgentResult(
+                success=False,
+                result="",
+                session_id=session_id or "",
+                error="Request timed out",
+            )
+        except Exception as e:
+            return AgentResult(
+                success=False,
+                result="",
+                session_id=session_id or "",
+                error=str(e),
+            )
+        finally:
+            if process is not None:
+                await self._reap(process)
+    
+    async def iter_stream(
+        self,
+        prompt: str,
+        session_id: Optional[str] = None,
+        stream_partial: bool = True,
+        mode: Optional[str] = None,
+    ) -> AsyncIterator[AgentEvent]:
+        """
+        Async streaming query, yielding each event as it arrives.
+        
+        Lines are read straight off the asyncio subprocess pipe, so only
+        the event being handled is held in memory and a slow consumer
+        throttles the agent through the pipe. Breaking out early kills
+        the agent once the generator is closed; wrap it in
+        contextlib.aclosing() to have that happen immediately.
+        
+            async for event in client.iter_stream("Hello"):
+                print(event.text, end="")
+        """
+        cmd = self._sync_client._build_command(
+            prompt,
+            session_id=session_id,
+            output_format=OutputFormat.STREAM_JSON,
+            stream_partial=stream_partial,
+            mode=mode,
         )
+        parse_event = self._sync_client._parse_event
+        
+        process = await self._spawn(cmd)
+        try:
+            if process.stdin:
+                process.stdin.write(prompt.encode("utf-8"))
+                await process.stdin.drain()
+                process.stdin.close()
+            
+            if process.stdout:
+                async for line in process.stdout:
+                    line = line.strip()
+                    if line:
+                        event = parse_event(line)
+                        if event:
+                            yield event
+            await process.wait()
+        finally:
+            await self._reap(process)
     
     async def query_stream(
         self,
@@ -614,47 +1465,50 @@ class AsyncCursorAgentClient:
         """
         Async streaming query.
         
-        Since Python subprocess doesn't support true async iteration,
-        this runs in a thread and collects events, optionally calling
-        a callback for each event.
+        Calls the callback, if any, for each event as it arrives and
+        returns all events once the agent exits. Use iter_stream() to
+        handle events without keeping them all.
         """
-        def _stream():
-            events = []
-            for event in self._sync_client.query_stream(
-                prompt, session_id, stream_partial, mode
-            ):
-                events.append(event)
-                if callback:
-                    callback(event)
-            return events
-        
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(self._executor, _stream)
+        events = []
+        async for event in self.iter_stream(
+            prompt,
+            session_id=session_id,
+            stream_partial=stream_partial,
+            mode=mode,
+        ):
+            events.append(event)
+            if callback:
+                callback(event)
+        return events
     
     async def create_session(self) -> str:
         """Async version of create_session."""
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(
-            self._executor, self._sync_client.create_session
-        )
+        # Runs on the interpreter-wide default pool; no per-client threads
+        return await asyncio.to_thread(self._sync_client.create_session)
 
 
 class AsyncConversationSession:
-    """Async version of ConversationSession."""
+    """Async version of ConversationSession (history_limit works the same way)."""
     
     def __init__(
         self,
         client: Optional[AsyncCursorAgentClient] = None,
         session_id: Optional[str] = None,
+        history_limit: Optional[int] = None,
     ):
         self.client = client or AsyncCursorAgentClient()
         self._session_id = session_id
-        self._history: list[tuple[str, AgentResult]] = []
+        self._history: deque[tuple[str, AgentResult]] = deque(maxlen=history_limit)
     
     @property
     def session_id(self) -> Optional[str]:
         return self._session_id
     
+    @property
+    def history(self) -> Sequence[tuple[str, AgentResult]]:
+        """Read-only view of (prompt, result) pairs (not a copy)."""
+        return _DequeView(self._history)
+    
     async def send(
         self,
         prompt: str,
@@ -724,13 +1578,31 @@ def collect_text(events: Iterable[AgentEvent], include_thinking: bool = False) -
     Returns:
         Concatenated text from the stream
     """
-    parts = []
+    if isinstance(events, StreamingResponse):
+        return events._collect_text(include_thinking)
+    return _collect_event_text(events, include_thinking)
+
+
+def _collect_event_text(events: Iterable[AgentEvent], include_thinking: bool) -> str:
+    """collect_text() over already parsed events."""
+    # Gather the pieces and join once; join sizes the result exactly.
+    # Loop-invariant lookups are bound to locals for the per-event loop.
+    parts: list[str] = []
+    append = parts.append
+    assistant_delta = EventType.ASSISTANT_DELTA
+    thinking_delta = EventType.THINKING_DELTA
+    result_success = EventType.RESULT_SUCCESS
     for event in events:
-        if event.type == EventType.ASSISTANT_DELTA and event.text:
-            parts.append(event.text)
-        elif event.type == EventType.THINKING_DELTA and include_thinking and event.text:
-            parts.append(f"[thinking: {event.text}]")
-        elif event.type == EventType.RESULT_SUCCESS:
+        event_type = event.type
+        if event_type is assistant_delta:
+            text = event.text
+            if text:
+                append(text)
+        elif event_type is thinking_delta:
+            text = event.text
+            if include_thinking and text:
+                append(f"[thinking: {text}]")
+        elif event_type is result_success:
             # Use the final result instead if no deltas were collected
             if not parts and event.text:
                 return event.text
@@ -4,10 +4,24 @@ Patch cursor-agent to enable 'Run Everything' option.
 This bypasses the team admin restriction on --force flag.
 """
 
+import contextlib
+import json
+import mmap
 import os
 import shutil
 import sys
+import tempfile
 from pathlib import Path
+from typing import Generator, Iterable, Optional
+
+# The flag is plain ASCII, so it can be matched on the raw bytes of
+# index.js without decoding the (multi-MB) bundle
+PATTERN_PREFIX = b"enableRunEverything = "
+PATTERN_DISABLED = PATTERN_PREFIX + b"false"
+PATTERN_ENABLED = PATTERN_PREFIX + b"true"
+
+# Where the flag offsets of the last scanned index.js are remembered
+OFFSETS_CACHE = Path.home() / ".cache" / "cursor_agent_api" / "patch_offsets.json"
 
 
 def find_cursor_agent_dir() -> Path:
@@ -22,14 +36,122 @@ def find_cursor_agent_dir() -> Path:
 
 def find_latest_version(versions_dir: Path) -> str:
     """Find the most recent version directory."""
-    versions = sorted(
-        versions_dir.iterdir(),
-        key=lambda p: p.stat().st_mtime,
-        reverse=True
-    )
-    if not versions:
+    # scandir() reuses the readdir data where it can, and a single max()
+    # pass is enough since only the newest entry is needed. st_mtime_ns is
+    # an exact int, unlike the rounded float st_mtime.
+    with os.scandir(versions_dir) as entries:
+        latest = max(entries, key=lambda e: e.stat().st_mtime_ns, default=None)
+    if latest is None:
         raise FileNotFoundError("No cursor-agent versions found")
-    return versions[0].name
+    return latest.name
+
+
+def _scan_flag(buf: bytes | mmap.mmap) -> tuple[int, list[int]]:
+    """
+    Find the flag assignments in buf with a single scan.
+    
+    Returns:
+        The offset of the first enabled assignment (-1 if there is none),
+        and the offsets of the disabled ones seen before it.
+    """
+    disabled: list[int] = []
+    index = buf.find(PATTERN_PREFIX)
+    while index != -1:
+        if buf[index:index + len(PATTERN_ENABLED)] == PATTERN_ENABLED:
+            return index, disabled
+        if buf[index:index + len(PATTERN_DISABLED)] == PATTERN_DISABLED:
+            disabled.append(index)
+        index = buf.find(PATTERN_PREFIX, index + len(PATTERN_PREFIX))
+    return -1, disabled
+
+
+def _load_scan(path: Path, st: os.stat_result, buf: bytes | mmap.mmap) -> Optional[tuple[int, list[int]]]:
+    """
+    Return the cached _scan_flag() result for path, or None if stale.
+    
+    The cache is trusted only while the file's size and mtime match, and
+    each recorded offset is spot-checked instead of rescanning the file.
+    """
+    try:
+        entry = json.loads(OFFSETS_CACHE.read_text())[str(path)]
+        if (entry["size"], entry["mtime_ns"]) != (st.st_size, st.st_mtime_ns):
+            return None
+        enabled_at = entry["enabled_at"]
+        offsets = entry["offsets"]
+        expected = [(offset, PATTERN_DISABLED) for offset in offsets]
+        if enabled_at != -1:
+            expected.append((enabled_at, PATTERN_ENABLED))
+        for offset, pattern in expected:
+            if buf[offset:offset + len(pattern)] != pattern:
+                return None
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    return enabled_at, offsets
+
+
+def _store_scan(path: Path, st: os.stat_result, scan: tuple[int, list[int]]) -> None:
+    """Remember the _scan_flag() result for path; failures are ignored."""
+    enabled_at, offsets = scan
+    entry = {
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "enabled_at": enabled_at,
+        "offsets": offsets,
+    }
+    try:
+        OFFSETS_CACHE.parent.mkdir(parents=True, exist_ok=True)
+        OFFSETS_CACHE.write_text(json.dumps({str(path): entry}))
+    except OSError:
+        pass
+
+
+def _splice(
+    buf: bytes | mmap.mmap, offsets: list[int], old: bytes, new: bytes
+) -> Generator[bytes | memoryview, None, None]:
+    """Yield the pieces of buf with old replaced by new at each offset."""
+    # Slicing a memoryview does not copy, so the unchanged runs of buf go
+    # straight from the mapping to the writer
+    with memoryview(buf) as view:
+        start = 0
+        for index in offsets:
+            yield view[start:index]
+            yield new
+            start = index + len(old)
+        yield view[start:]
+
+
+def _backup(src: Path, dst: Path) -> None:
+    """Back up src as dst, hard-linking when possible."""
+    # A hard link copies no data; it stays a faithful backup because the
+    # patched file is written as a new inode rather than in place
+    try:
+        os.link(src, dst)
+    except OSError:
+        # Cross-device, or a filesystem without hard links
+        shutil.copy2(src, dst)
+
+
+def _atomic_write(path: Path, chunks: Iterable[bytes | memoryview]) -> None:
+    """
+    Replace path with the concatenated chunks atomically.
+    
+    The chunks go to a temporary sibling that is renamed over path, so a
+    crash never leaves a half-written file behind, and a hard-linked
+    backup keeps the original inode.
+    """
+    fd, tmp_name = tempfile.mkstemp(
+        dir=path.parent, prefix=f".{path.stem}.", suffix=f"{path.suffix}.tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.writelines(chunks)
+            f.flush()
+            os.fsync(f.fileno())
+        shutil.copymode(path, tmp_name)
+        os.replace(tmp_name, path)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
 
 
 def patch_cursor_agent(dry_run: bool = False) -> bool:
@@ -54,52 +176,64 @@ def patch_cursor_agent(dry_run: bool = False) -> bool:
         print(f"Found cursor-agent version: {latest_version}")
         print(f"Target file: {index_js}")
         
-        # Read the file content
-        content = index_js.read_text()
-        
-        # Check if already patched
-        if "enableRunEverything = true" in content:
-            print("Already patched! enableRunEverything is already set to true.")
-            return False
-        
-        # Check if the pattern exists
-        if "enableRunEverything = false" not in content:
-            print("Warning: Pattern 'enableRunEverything = false' not found.")
-            print("The file structure may have changed in this version.")
-            return False
+        # Map the file instead of reading and decoding it; mmap cannot map
+        # an empty file, which simply has nothing to patch
+        with open(index_js, "rb") as f:
+            st = os.fstat(f.fileno())
+            with (
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                if st.st_size else contextlib.nullcontext(b"")
+            ) as content:
+                # Reuse the offsets from a previous run if the file is
+                # unchanged; otherwise one pass locates both flag forms
+                scan = _load_scan(index_js, st, content)
+                if scan is None:
+                    scan = _scan_flag(content)
+                    _store_scan(index_js, st, scan)
+                enabled_at, offsets = scan
+                
+                # Check if already patched
+                if enabled_at != -1:
+                    print("Already patched! enableRunEverything is already set to true.")
+                    return False
+                
+                # Check if the pattern exists
+                if not offsets:
+                    print("Warning: Pattern 'enableRunEverything = false' not found.")
+                    print("The file structure may have changed in this version.")
+                    return False
+                
+                if dry_run:
+                    print("Dry run: Patch would be applied.")
+                    return True
+                
+                # Create backup
+                backup_file = index_js.with_suffix(".js.bak")
+                if not backup_file.exists():
+                    print(f"Creating backup at {backup_file}")
+                    _backup(index_js, backup_file)
+                else:
+                    print(f"Backup already exists at {backup_file}")
+                
+                # Apply patch. The flag was found above, so the spliced
+                # content holds the enabled flag by construction; no need
+                # to read the file back to verify it.
+                print("Applying patch...")
+                pieces = _splice(content, offsets, PATTERN_DISABLED, PATTERN_ENABLED)
+                try:
+                    _atomic_write(index_js, pieces)
+                finally:
+                    # Release the views into the mapping even if the write
+                    # stopped halfway, so it can be closed
+                    pieces.close()
         
-        if dry_run:
-            print("Dry run: Patch would be applied.")
-            return True
+        # The first replaced flag is now the first enabled one
+        _store_scan(index_js, os.stat(index_js), (offsets[0], []))
         
-        # Create backup
-        backup_file = index_js.with_suffix(".js.bak")
-        if not backup_file.exists():
-            print(f"Creating backup at {backup_file}")
-            shutil.copy2(index_js, backup_file)
-        else:
-            print(f"Backup already exists at {backup_file}")
-        
-        # Apply patch
-        print("Applying patch...")
-        patched_content = content.replace(
-            "enableRunEverything = false",
-            "enableRunEverything = true"
-        )
-        index_js.write_text(patched_content)
-        
-        # Verify patch
-        verify_content = index_js.read_text()
-        if "enableRunEverything = true" in verify_content:
-            print("Patch applied successfully!")
-            print()
-            print("You can now use: agent -f -p 'your prompt'")
-            return True
-        else:
-            print("Error: Patch verification failed", file=sys.stderr)
-            print("Restoring from backup...", file=sys.stderr)
-            shutil.copy2(backup_file, index_js)
-            return False
+        print("Patch applied successfully!")
+        print()
+        print("You can now use: agent -f -p 'your prompt'")
+        return True
             
     except FileNotFoundError as e:
         print(f"Error: {e}", file=sys.stderr)
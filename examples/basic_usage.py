@@ -79,14 +79,29 @@ def example_streaming_with_thinking():
     print("Example 4: Streaming with Thinking")
     print("=" * 50)
     
-    for event in query_stream("What is 17 * 23?"):
-        if event.type == EventType.THINKING_DELTA and event.text:
+    def on_thinking(event):
+        if event.text:
             print(f"[Thinking: {event.text}]", end="", flush=True)
-        elif event.type == EventType.THINKING_COMPLETED:
-            print("\n---")
-        elif event.type == EventType.ASSISTANT_DELTA and event.text:
+    
+    def on_thinking_done(event):
+        print("\n---")
+    
+    def on_delta(event):
+        if event.text:
             print(event.text, end="", flush=True)
     
+    # One dict lookup per event instead of a chain of comparisons
+    handlers = {
+        EventType.THINKING_DELTA: on_thinking,
+        EventType.THINKING_COMPLETED: on_thinking_done,
+        EventType.ASSISTANT_DELTA: on_delta,
+    }
+    
+    for event in query_stream("What is 17 * 23?"):
+        handler = handlers.get(event.type)
+        if handler:
+            handler(event)
+    
     print("\n")
 
 
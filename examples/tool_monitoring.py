@@ -39,29 +39,40 @@ def monitor_tool_calls():
     
     tool_calls = []
     
+    def on_tool_started(event):
+        print(f"🔧 TOOL STARTED: {event.data}")
+        tool_calls.append({
+            'type': 'started',
+            'data': event.data
+        })
+    
+    def on_tool_completed(event):
+        print(f"✅ TOOL COMPLETED: {event.data}")
+        tool_calls.append({
+            'type': 'completed',
+            'data': event.data
+        })
+    
+    def on_result(event):
+        print(f"\n\n----- FINAL RESULT -----")
+        print(event.text)
+    
+    # Build the dispatch table once; each event then costs a single lookup
+    handlers = {
+        EventType.TOOL_CALL_STARTED: on_tool_started,
+        EventType.TOOL_CALL_COMPLETED: on_tool_completed,
+        EventType.RESULT_SUCCESS: on_result,
+    }
+    
     for event in client.query_stream(prompt):
-        if event.type == EventType.TOOL_CALL_STARTED:
-            tool_data = event.data
-            print(f"🔧 TOOL STARTED: {tool_data}")
-            tool_calls.append({
-                'type': 'started',
-                'data': tool_data
-            })
-            
-        elif event.type == EventType.TOOL_CALL_COMPLETED:
-            tool_data = event.data
-            print(f"✅ TOOL COMPLETED: {tool_data}")
-            tool_calls.append({
-                'type': 'completed',
-                'data': tool_data
-            })
-            
-        elif event.type == EventType.ASSISTANT_DELTA and event.text:
-            print(event.text, end="", flush=True)
-            
-        elif event.type == EventType.RESULT_SUCCESS:
-            print(f"\n\n----- FINAL RESULT -----")
-            print(event.text)
+        # Deltas are by far the most frequent event, so check them first
+        if event.type is EventType.ASSISTANT_DELTA:
+            if event.text:
+                print(event.text, end="", flush=True)
+            continue
+        handler = handlers.get(event.type)
+        if handler:
+            handler(event)
     
     print(f"\n----- TOOL CALL SUMMARY -----")
     print(f"Total tool operations: {len(tool_calls)}")
@@ -6,11 +6,19 @@ Run with: python3 -m pytest test_unit.py -v
 Or: python3 test_unit.py
 """
 
+import asyncio
+import dataclasses
+import gc
 import json
+import os
 import subprocess
+import sys
+import tempfile
+import threading
 import unittest
-from unittest.mock import Mock, MagicMock, patch, PropertyMock
-from io import StringIO
+from unittest.mock import Mock, MagicMock, AsyncMock, patch, PropertyMock
+from io import StringIO, BytesIO
+from pathlib import Path
 
 from cursor_agent_api import (
     # Enums
@@ -32,8 +40,70 @@ from cursor_agent_api import (
     aquery,
     collect_text,
 )
+from cursor_agent_api import client as client_module
+from cursor_agent_api.client import MODELS_CACHE_TTL, STREAM_BUFFER_SIZE
+from cursor_agent_api import patch as patch_module
+from cursor_agent_api.patch import find_latest_version, patch_cursor_agent
 
 
+_EVENT_TYPE_VALUES = (
+    (EventType.SYSTEM_INIT, "system:init"),
+    (EventType.USER, "user"),
+    (EventType.THINKING_DELTA, "thinking:delta"),
+    (EventType.THINKING_COMPLETED, "thinking:completed"),
+    (EventType.ASSISTANT, "assistant"),
+    (EventType.ASSISTANT_DELTA, "assistant:delta"),
+    (EventType.TOOL_CALL_STARTED, "tool-call-started"),
+    (EventType.TOOL_CALL_COMPLETED, "tool-call-completed"),
+    (EventType.RESULT_SUCCESS, "result:success"),
+    (EventType.RESULT_ERROR, "result:error"),
+    (EventType.UNKNOWN, "unknown"),
+)
+
+# Delta lines shared by several stream tests
+_ASSISTANT_HI = '{"type": "assistant", "text": "Hi", "timestamp_ms": 123}'
+_ASSISTANT_BYE = '{"type": "assistant", "text": "Bye", "timestamp_ms": 124}'
+_ASSISTANT_HI_LINE = _ASSISTANT_HI.encode() + b"\n"
+
+# (stream line, expected type, expected text or None to not check it)
+_PARSE_EVENT_CASES = (
+    ('{"type": "user", "message": {"role": "user", "content": [{"type": "text", "text": "Hello"}]}}',
+     EventType.USER, "Hello"),
+    ('{"type": "thinking", "subtype": "delta", "text": "Thinking...", "timestamp_ms": 123}',
+     EventType.THINKING_DELTA, "Thinking..."),
+    ('{"type": "thinking", "subtype": "completed"}',
+     EventType.THINKING_COMPLETED, None),
+    ('{"type": "assistant", "text": "Hello", "timestamp_ms": 123}',
+     EventType.ASSISTANT_DELTA, "Hello"),
+    ('{"type": "assistant", "message": {"role": "assistant", "content": [{"type": "text", "text": "Hi there"}]}}',
+     EventType.ASSISTANT, "Hi there"),
+    # Deltas without top-level text fall back to message content
+    ('{"type": "assistant", "timestamp_ms": 1, "message": {"content": [{"type": "text", "text": "Hi"}]}}',
+     EventType.ASSISTANT_DELTA, "Hi"),
+    ('{"type": "tool-call-started", "tool_name": "Shell", "parameters": {"command": "ls"}}',
+     EventType.TOOL_CALL_STARTED, None),
+    ('{"type": "tool-call-completed", "tool_name": "Shell", "result": {"output": "file.txt"}}',
+     EventType.TOOL_CALL_COMPLETED, None),
+    ('{"type": "result", "subtype": "success", "result": "Done!", "session_id": "abc"}',
+     EventType.RESULT_SUCCESS, "Done!"),
+    ('{"type": "result", "subtype": "error", "error": "Failed"}',
+     EventType.RESULT_ERROR, None),
+    ('{"type": "custom_event", "data": "something"}',
+     EventType.UNKNOWN, None),
+    # System events other than init
+    ('{"type": "system", "subtype": "shutdown"}',
+     EventType.UNKNOWN, None),
+)
+
+
+# (returncode, stdout, stderr, subprocess.run side_effect, expected error)
+_QUERY_FAILURE_CASES = (
+    (1, b'', b'Error message', None, "Error message"),
+    (0, b'not valid json', b'', None, "Failed to parse JSON"),
+    (None, None, None, subprocess.TimeoutExpired("cmd", 30), "Request timed out"),
+    (None, None, None, Exception("Connection failed"), "Connection failed"),
+)
+
 class TestOutputFormat(unittest.TestCase):
     """Tests for OutputFormat enum."""
     
@@ -43,29 +113,19 @@ class TestOutputFormat(unittest.TestCase):
         self.assertEqual(OutputFormat.STREAM_JSON.value, "stream-json")
     
     def test_all_formats_defined(self):
-        formats = list(OutputFormat)
-        self.assertEqual(len(formats), 3)
+        self.assertEqual(len(OutputFormat.__members__), 3)
 
 
 class TestEventType(unittest.TestCase):
     """Tests for EventType enum."""
     
     def test_values(self):
-        self.assertEqual(EventType.SYSTEM_INIT.value, "system:init")
-        self.assertEqual(EventType.USER.value, "user")
-        self.assertEqual(EventType.THINKING_DELTA.value, "thinking:delta")
-        self.assertEqual(EventType.THINKING_COMPLETED.value, "thinking:completed")
-        self.assertEqual(EventType.ASSISTANT.value, "assistant")
-        self.assertEqual(EventType.ASSISTANT_DELTA.value, "assistant:delta")
-        self.assertEqual(EventType.TOOL_CALL_STARTED.value, "tool-call-started")
-        self.assertEqual(EventType.TOOL_CALL_COMPLETED.value, "tool-call-completed")
-        self.assertEqual(EventType.RESULT_SUCCESS.value, "result:success")
-        self.assertEqual(EventType.RESULT_ERROR.value, "result:error")
-        self.assertEqual(EventType.UNKNOWN.value, "unknown")
+        for event_type, value in _EVENT_TYPE_VALUES:
+            with self.subTest(event_type=event_type):
+                self.assertEqual(event_type.value, value)
     
     def test_all_event_types_defined(self):
-        events = list(EventType)
-        self.assertEqual(len(events), 11)
+        self.assertEqual(len(EventType.__members__), 11)
 
 
 class TestAgentConfig(unittest.TestCase):
@@ -78,8 +138,10 @@ class TestAgentConfig(unittest.TestCase):
         self.assertFalse(config.force_approve)
         self.assertFalse(config.approve_mcps)
         self.assertIsNone(config.api_key)
-        self.assertEqual(config.headers, [])
+        self.assertEqual(config.headers, ())
         self.assertEqual(config.agent_binary, "agent")
+        self.assertTrue(config.keep_raw_data)
+        self.assertTrue(config.fast_spawn)
     
     def test_custom_values(self):
         config = AgentConfig(
@@ -96,8 +158,23 @@ class TestAgentConfig(unittest.TestCase):
         self.assertTrue(config.force_approve)
         self.assertTrue(config.approve_mcps)
         self.assertEqual(config.api_key, "sk-test")
-        self.assertEqual(config.headers, ["X-Custom: value"])
+        self.assertEqual(config.headers, ("X-Custom: value",))
         self.assertEqual(config.agent_binary, "/usr/bin/agent")
+    
+    def test_frozen(self):
+        config = AgentConfig()
+        with self.assertRaises(dataclasses.FrozenInstanceError):
+            config.model = "gpt-4"
+    
+    def test_slots(self):
+        self.assertFalse(hasattr(AgentConfig(), "__dict__"))
+    
+    def test_headers_cannot_change_in_place(self):
+        headers = ["X-A: 1"]
+        config = AgentConfig(headers=headers)
+        headers.append("X-B: 2")
+        self.assertEqual(config.headers, ("X-A: 1",))
+        self.assertFalse(hasattr(config.headers, "append"))
 
 
 class TestAgentEvent(unittest.TestCase):
@@ -139,6 +216,15 @@ class TestAgentEvent(unittest.TestCase):
         self.assertIsNone(event.text)
         self.assertIsNone(event.session_id)
         self.assertIsNone(event.timestamp_ms)
+    
+    def test_slots(self):
+        event = AgentEvent(
+            type=EventType.UNKNOWN,
+            raw_type="unknown",
+            subtype=None,
+            data={},
+        )
+        self.assertFalse(hasattr(event, "__dict__"))
 
 
 class TestAgentResult(unittest.TestCase):
@@ -180,6 +266,73 @@ class TestAgentResult(unittest.TestCase):
         )
         self.assertFalse(result.success)
         self.assertEqual(result.error, "Something went wrong")
+    
+    def test_slots(self):
+        result = AgentResult(success=True, result="Hello", session_id="abc-123")
+        self.assertFalse(hasattr(result, "__dict__"))
+
+
+# 100 delta lines, for tests that stop partway through a stream
+_MANY_DELTA_LINES = tuple(
+    f'{{"type": "assistant", "text": "{i}", "timestamp_ms": {i}}}\n' for i in range(100)
+)
+
+
+def _make_parse_event():
+    """Build a simple parse_event function for StreamingResponse tests."""
+    # The client's own decoder: orjson when installed, else json.loads
+    loads = client_module._json_loads
+    
+    def parse_event(line):
+        try:
+            data = loads(line)
+            return AgentEvent(
+                type=EventType.ASSISTANT_DELTA,
+                raw_type=data.get("type", "unknown"),
+                subtype=data.get("subtype"),
+                data=data,
+                text=data.get("text"),
+                session_id=data.get("session_id"),
+                timestamp_ms=data.get("timestamp_ms"),
+            )
+        except ValueError:  # json and orjson decode errors alike
+            return None
+    return parse_event
+
+
+# Stateless, so one instance serves every StreamingResponse test
+_PARSE_EVENT = _make_parse_event()
+
+
+class _FakePopen:
+    """
+    Minimal stand-in for subprocess.Popen in StreamingResponse tests.
+    
+    Much cheaper to build than Mock(spec=subprocess.Popen), which inspects
+    the whole Popen class. poll() returns poll; the first wait_timeouts
+    calls to wait() raise TimeoutExpired and later ones return 0. The
+    timeout of each wait() call is recorded in wait_calls; send_signal
+    and kill are Mocks so their calls can be asserted.
+    """
+    
+    def __init__(self, stdout=None, poll=None, wait_timeouts=0):
+        self.stdin = None
+        self.stdout = stdout
+        self.stderr = None
+        self._poll = poll
+        self._wait_timeouts = wait_timeouts
+        self.wait_calls = []
+        self.send_signal = Mock()
+        self.kill = Mock()
+    
+    def poll(self):
+        return self._poll
+    
+    def wait(self, timeout=None):
+        self.wait_calls.append(timeout)
+        if len(self.wait_calls) <= self._wait_timeouts:
+            raise subprocess.TimeoutExpired("cmd", timeout)
+        return 0
 
 
 class TestStreamingResponse(unittest.TestCase):
@@ -187,29 +340,7 @@ class TestStreamingResponse(unittest.TestCase):
     
     def _create_mock_process(self, lines):
         """Helper to create a mock process with stdout lines."""
-        process = Mock(spec=subprocess.Popen)
-        process.stdout = StringIO("\n".join(lines) + "\n" if lines else "")
-        process.poll.return_value = None
-        process.wait.return_value = 0
-        return process
-    
-    def _create_parse_event(self):
-        """Helper to create a simple parse_event function."""
-        def parse_event(line):
-            try:
-                data = json.loads(line)
-                return AgentEvent(
-                    type=EventType.ASSISTANT_DELTA,
-                    raw_type=data.get("type", "unknown"),
-                    subtype=data.get("subtype"),
-                    data=data,
-                    text=data.get("text"),
-                    session_id=data.get("session_id"),
-                    timestamp_ms=data.get("timestamp_ms"),
-                )
-            except json.JSONDecodeError:
-                return None
-        return parse_event
+        return _FakePopen(stdout=(line + "\n" for line in lines))
     
     def test_iteration(self):
         """Test iterating over events."""
@@ -218,7 +349,7 @@ class TestStreamingResponse(unittest.TestCase):
             '{"type": "assistant", "text": " World", "timestamp_ms": 124}',
         ]
         process = self._create_mock_process(lines)
-        stream = StreamingResponse(process, self._create_parse_event())
+        stream = StreamingResponse(process, _PARSE_EVENT)
         
         events = list(stream)
         self.assertEqual(len(events), 2)
@@ -226,10 +357,10 @@ class TestStreamingResponse(unittest.TestCase):
         self.assertEqual(events[1].text, " World")
     
     def test_events_property(self):
-        """Test events property returns copy of events."""
-        lines = ['{"type": "assistant", "text": "Hi", "timestamp_ms": 123}']
+        """Test events property returns a read-only view of events."""
+        lines = [_ASSISTANT_HI]
         process = self._create_mock_process(lines)
-        stream = StreamingResponse(process, self._create_parse_event())
+        stream = StreamingResponse(process, _PARSE_EVENT, collect_events=True)
         
         list(stream)  # Consume iterator
         
@@ -237,18 +368,116 @@ class TestStreamingResponse(unittest.TestCase):
         self.assertEqual(len(events), 1)
         self.assertEqual(events[0].text, "Hi")
         
-        # Verify it's a copy
-        events.append(None)
-        self.assertEqual(len(stream.events), 1)
+        # Verify it's a read-only view
+        self.assertFalse(hasattr(events, "append"))
+        self.assertEqual(events, [events[0]])
+    
+    def test_events_property_is_live_view(self):
+        """Test events is one view that tracks the stream as it is consumed."""
+        lines = [
+            '{"type": "assistant", "text": "Hi", "timestamp_ms": 1}',
+            '{"type": "assistant", "text": "!", "timestamp_ms": 2}',
+        ]
+        process = self._create_mock_process(lines)
+        stream = StreamingResponse(process, _PARSE_EVENT, collect_events=True)
+        events = stream.events
+        
+        for i, event in enumerate(stream, 1):
+            self.assertEqual(len(events), i)
+            self.assertIs(events[-1], event)
+        
+        self.assertIs(stream.events, events)
+    
+    def test_events_retains_only_init_and_result_by_default(self):
+        """Test deltas are not retained unless collect_events=True."""
+        lines = [
+            '{"type": "system", "subtype": "init", "session_id": "s"}',
+            _ASSISTANT_HI,
+            '{"type": "result", "subtype": "success", "result": "Hi"}',
+        ]
+        process = self._create_mock_process(lines)
+        stream = StreamingResponse(process, CursorAgentClient()._parse_event)
+        
+        self.assertEqual(len(list(stream)), 3)
+        self.assertEqual(
+            [e.type for e in stream.events],
+            [EventType.SYSTEM_INIT, EventType.RESULT_SUCCESS],
+        )
+    
+    def test_iteration_over_real_pipe(self):
+        """Test lines are reassembled across os.read() chunk boundaries."""
+        long_text = "x" * (STREAM_BUFFER_SIZE * 2)
+        payload = (
+            '{"type": "assistant", "text": "Hi", "timestamp_ms": 1}\n'
+            '{"type": "assistant", "text": "%s", "timestamp_ms": 2}\n'
+            '{"type": "assistant", "text": "Bye", "timestamp_ms": 3}' % long_text
+        ).encode()
+        
+        read_fd, write_fd = os.pipe()
+        writer = threading.Thread(target=lambda: (os.write(write_fd, payload), os.close(write_fd)))
+        writer.start()
+        
+        process = _FakePopen(stdout=os.fdopen(read_fd, "rb"))
+        stream = StreamingResponse(process, _PARSE_EVENT)
+        
+        events = list(stream)
+        writer.join()
+        process.stdout.close()
+        
+        self.assertEqual([e.text for e in events], ["Hi", long_text, "Bye"])
+    
+    def test_iteration_resumes_after_break_over_real_pipe(self):
+        """Test lines already read from the pipe survive a break and resume."""
+        payload = (
+            b'{"type": "system", "subtype": "init", "session_id": "s"}\n'
+            + _ASSISTANT_HI_LINE
+            + _ASSISTANT_BYE.encode() + b"\n"
+            + b'{"type": "result", "subtype": "success", "result": "HiBye", "session_id": "s"}\n'
+        )
+        read_fd, write_fd = os.pipe()
+        os.write(write_fd, payload)
+        os.close(write_fd)
+        
+        process = _FakePopen(stdout=os.fdopen(read_fd, "rb"))
+        self.addCleanup(process.stdout.close)
+        stream = StreamingResponse(process, CursorAgentClient()._parse_event)
+        
+        for first in stream:
+            break
+        rest = list(stream)
+        
+        self.assertEqual(first.type, EventType.SYSTEM_INIT)
+        self.assertEqual(
+            [e.type for e in rest],
+            [EventType.ASSISTANT_DELTA, EventType.ASSISTANT_DELTA, EventType.RESULT_SUCCESS],
+        )
+        result = ConversationSession().finalize_stream("Hello", stream)
+        self.assertEqual(result.result, "HiBye")
+    
+    def test_read_timeout(self):
+        """Test a silent stream is cancelled with TimeoutError."""
+        read_fd, write_fd = os.pipe()
+        os.write(write_fd, b'{"type": "assistant", "text": "Hi", "timestamp_ms": 1}\n')
+        
+        process = _FakePopen(stdout=os.fdopen(read_fd, "rb"))
+        stream = StreamingResponse(process, _PARSE_EVENT, read_timeout=0.01)
+        
+        events = []
+        with self.assertRaises(TimeoutError):
+            for event in stream:
+                events.append(event)
+        os.close(write_fd)
+        process.stdout.close()
+        
+        self.assertEqual(len(events), 1)
+        self.assertTrue(stream.cancelled)
+        process.send_signal.assert_called_once_with(15)
     
     def test_cancel(self):
         """Test cancelling the stream."""
-        process = Mock(spec=subprocess.Popen)
-        process.poll.return_value = None
-        process.wait.return_value = 0
-        process.stdout = iter([])
+        process = _FakePopen(stdout=iter([]))
         
-        stream = StreamingResponse(process, self._create_parse_event())
+        stream = StreamingResponse(process, _PARSE_EVENT)
         
         self.assertFalse(stream.cancelled)
         stream.cancel()
@@ -257,22 +486,18 @@ class TestStreamingResponse(unittest.TestCase):
     
     def test_cancel_with_custom_signal(self):
         """Test cancelling with custom signal."""
-        process = Mock(spec=subprocess.Popen)
-        process.poll.return_value = None
-        process.wait.return_value = 0
+        process = _FakePopen()
         
-        stream = StreamingResponse(process, self._create_parse_event())
+        stream = StreamingResponse(process, _PARSE_EVENT)
         stream.cancel(signal=9)
         
         process.send_signal.assert_called_once_with(9)
     
     def test_cancel_already_cancelled(self):
         """Test cancelling an already cancelled stream."""
-        process = Mock(spec=subprocess.Popen)
-        process.poll.return_value = None
-        process.wait.return_value = 0
+        process = _FakePopen()
         
-        stream = StreamingResponse(process, self._create_parse_event())
+        stream = StreamingResponse(process, _PARSE_EVENT)
         stream.cancel()
         stream.cancel()  # Second cancel should be no-op
         
@@ -280,34 +505,39 @@ class TestStreamingResponse(unittest.TestCase):
     
     def test_cancel_process_already_terminated(self):
         """Test cancelling when process already terminated."""
-        process = Mock(spec=subprocess.Popen)
-        process.poll.return_value = 0  # Already terminated
+        process = _FakePopen(poll=0)  # Already terminated
         
-        stream = StreamingResponse(process, self._create_parse_event())
+        stream = StreamingResponse(process, _PARSE_EVENT)
         stream.cancel()
         
         process.send_signal.assert_not_called()
     
     def test_cancel_with_timeout(self):
         """Test cancel falls back to kill on timeout."""
-        process = Mock(spec=subprocess.Popen)
-        process.poll.return_value = None
-        process.wait.side_effect = [subprocess.TimeoutExpired("cmd", 2), 0]
+        process = _FakePopen(wait_timeouts=1)
         
-        stream = StreamingResponse(process, self._create_parse_event())
+        stream = StreamingResponse(process, _PARSE_EVENT)
         stream.cancel()
         
         process.send_signal.assert_called_once()
         process.kill.assert_called_once()
+        self.assertIn(2.0, process.wait_calls)
+    
+    def test_cancel_with_custom_timeout(self):
+        """Test cancel waits only as long as requested before killing."""
+        process = _FakePopen(wait_timeouts=1)
+        
+        stream = StreamingResponse(process, _PARSE_EVENT)
+        stream.cancel(timeout=0.1)
+        
+        self.assertIn(0.1, process.wait_calls)
+        process.kill.assert_called_once()
     
     def test_context_manager(self):
         """Test using as context manager."""
-        process = Mock(spec=subprocess.Popen)
-        process.poll.return_value = None
-        process.wait.return_value = 0
-        process.stdout = iter([])
+        process = _FakePopen(stdout=iter([]))
         
-        stream = StreamingResponse(process, self._create_parse_event())
+        stream = StreamingResponse(process, _PARSE_EVENT)
         
         with stream as s:
             self.assertIs(s, stream)
@@ -317,11 +547,9 @@ class TestStreamingResponse(unittest.TestCase):
     
     def test_context_manager_process_finished(self):
         """Test context manager when process already finished."""
-        process = Mock(spec=subprocess.Popen)
-        process.poll.return_value = 0  # Already finished
-        process.stdout = iter([])
+        process = _FakePopen(stdout=iter([]), poll=0)  # Already finished
         
-        stream = StreamingResponse(process, self._create_parse_event())
+        stream = StreamingResponse(process, _PARSE_EVENT)
         
         with stream:
             pass
@@ -331,26 +559,16 @@ class TestStreamingResponse(unittest.TestCase):
     
     def test_process_property(self):
         """Test process property."""
-        process = Mock(spec=subprocess.Popen)
-        stream = StreamingResponse(process, self._create_parse_event())
+        process = _FakePopen()
+        stream = StreamingResponse(process, _PARSE_EVENT)
         self.assertIs(stream.process, process)
     
     def test_iteration_stops_on_cancel(self):
         """Test iteration stops when cancelled."""
-        # Create a process that would yield many lines
-        lines = [f'{{"type": "assistant", "text": "{i}", "timestamp_ms": {i}}}' for i in range(100)]
-        
-        process = Mock(spec=subprocess.Popen)
-        process.poll.return_value = None
-        process.wait.return_value = 0
-        
-        # Use a generator for stdout to allow interleaved cancel
-        def line_generator():
-            for line in lines:
-                yield line + "\n"
-        
-        process.stdout = line_generator()
-        stream = StreamingResponse(process, self._create_parse_event())
+        # A process that would yield many lines; an iterator allows
+        # interleaved cancel
+        process = _FakePopen(stdout=iter(_MANY_DELTA_LINES))
+        stream = StreamingResponse(process, _PARSE_EVENT)
         
         collected = []
         for event in stream:
@@ -364,13 +582,13 @@ class TestStreamingResponse(unittest.TestCase):
     def test_empty_lines_skipped(self):
         """Test empty lines are skipped."""
         lines = [
-            '{"type": "assistant", "text": "Hi", "timestamp_ms": 123}',
+            _ASSISTANT_HI,
             '',
             '   ',
-            '{"type": "assistant", "text": "Bye", "timestamp_ms": 124}',
+            _ASSISTANT_BYE,
         ]
         process = self._create_mock_process(lines)
-        stream = StreamingResponse(process, self._create_parse_event())
+        stream = StreamingResponse(process, _PARSE_EVENT)
         
         events = list(stream)
         self.assertEqual(len(events), 2)
@@ -378,12 +596,12 @@ class TestStreamingResponse(unittest.TestCase):
     def test_invalid_json_skipped(self):
         """Test invalid JSON lines are skipped."""
         lines = [
-            '{"type": "assistant", "text": "Hi", "timestamp_ms": 123}',
+            _ASSISTANT_HI,
             'not valid json',
-            '{"type": "assistant", "text": "Bye", "timestamp_ms": 124}',
+            _ASSISTANT_BYE,
         ]
         process = self._create_mock_process(lines)
-        stream = StreamingResponse(process, self._create_parse_event())
+        stream = StreamingResponse(process, _PARSE_EVENT)
         
         events = list(stream)
         self.assertEqual(len(events), 2)
@@ -392,9 +610,27 @@ class TestStreamingResponse(unittest.TestCase):
 class TestCursorAgentClient(unittest.TestCase):
     """Tests for CursorAgentClient class."""
     
+    @classmethod
+    def setUpClass(cls):
+        # Shared by tests that only call pure methods (_parse_event,
+        # _build_command) or read the config; build your own to change it.
+        cls.default_client = CursorAgentClient()
+    
+    def setUp(self):
+        CursorAgentClient.invalidate_models_cache()
+        CursorAgentClient._binary_paths.clear()
+        # No test here may run the real agent; query tests set the result
+        run_patcher = patch('cursor_agent_api.client.subprocess.run')
+        self.mock_run = run_patcher.start()
+        self.addCleanup(run_patcher.stop)
+    
+    def _set_run_result(self, returncode=0, stdout=b'', stderr=b''):
+        """Make the patched subprocess.run return a finished process."""
+        self.mock_run.return_value = subprocess.CompletedProcess([], returncode, stdout, stderr)
+    
     def test_init_default_config(self):
         """Test initialization with default config."""
-        client = CursorAgentClient()
+        client = self.default_client
         self.assertIsNotNone(client.config)
         self.assertEqual(client.config.agent_binary, "agent")
     
@@ -407,17 +643,17 @@ class TestCursorAgentClient(unittest.TestCase):
     
     def test_build_command_basic(self):
         """Test basic command building."""
-        client = CursorAgentClient()
+        client = self.default_client
         cmd = client._build_command("Hello", output_format=OutputFormat.JSON)
         
-        self.assertIn("agent", cmd)
+        self.assertEqual(os.path.basename(cmd[0]), "agent")
         self.assertIn("--print", cmd)
         self.assertIn("--output-format", cmd)
         self.assertIn("json", cmd)
     
     def test_build_command_with_session(self):
         """Test command building with session ID."""
-        client = CursorAgentClient()
+        client = self.default_client
         cmd = client._build_command("Hello", session_id="abc-123")
         
         self.assertIn("--resume", cmd)
@@ -441,242 +677,392 @@ class TestCursorAgentClient(unittest.TestCase):
             mode="plan",
         )
         
-        self.assertIn("--workspace", cmd)
-        self.assertIn("/tmp", cmd)
-        self.assertIn("--model", cmd)
-        self.assertIn("gpt-4", cmd)
-        self.assertIn("-f", cmd)
-        self.assertIn("--approve-mcps", cmd)
-        self.assertIn("--api-key", cmd)
-        self.assertIn("sk-test", cmd)
-        self.assertIn("-H", cmd)
-        self.assertIn("X-Custom: value", cmd)
-        self.assertIn("--stream-partial-output", cmd)
-        self.assertIn("--mode", cmd)
-        self.assertIn("plan", cmd)
-    
-    def test_build_command_stream_partial_only_with_stream_json(self):
-        """Test stream_partial flag only added with STREAM_JSON format."""
-        client = CursorAgentClient()
+        expected = {
+            "--workspace", "/tmp",
+            "--model", "gpt-4",
+            "-f",
+            "--approve-mcps",
+            "--api-key", "sk-test",
+            "-H", "X-Custom: value",
+            "--stream-partial-output",
+            "--mode", "plan",
+        }
+        # Empty unless an option is missing, which the failure then names
+        self.assertEqual(expected.difference(cmd), set())
+    
+    def test_build_command_does_not_share_base_list(self):
+        """Test per-call arguments don't leak into the cached base command."""
+        client = CursorAgentClient(AgentConfig(model="gpt-4"))
         
-        # With STREAM_JSON
-        cmd1 = client._build_command("Hi", output_format=OutputFormat.STREAM_JSON, stream_partial=True)
-        self.assertIn("--stream-partial-output", cmd1)
+        cmd1 = client._build_command("Hi", session_id="abc-123", mode="plan")
+        cmd2 = client._build_command("Hi")
         
-        # With JSON (should not include)
-        cmd2 = client._build_command("Hi", output_format=OutputFormat.JSON, stream_partial=True)
-        self.assertNotIn("--stream-partial-output", cmd2)
+        self.assertIn("abc-123", cmd1)
+        self.assertNotIn("abc-123", cmd2)
+        self.assertNotIn("--mode", cmd2)
+        self.assertIn("gpt-4", cmd2)
     
-    def test_parse_event_system_init(self):
-        """Test parsing system init event."""
-        client = CursorAgentClient()
-        line = '{"type": "system", "subtype": "init", "session_id": "abc-123"}'
-        
-        event = client._parse_event(line)
+    def test_base_command_shared_by_equal_configs(self):
+        """Test clients with equal configs reuse one cached base command."""
+        first = CursorAgentClient(AgentConfig(model="gpt-4", headers=["X-A: 1"]))
+        second = CursorAgentClient(AgentConfig(model="gpt-4", headers=["X-A: 1"]))
         
-        self.assertEqual(event.type, EventType.SYSTEM_INIT)
-        self.assertEqual(event.raw_type, "system")
-        self.assertEqual(event.subtype, "init")
-        self.assertEqual(event.session_id, "abc-123")
+        self.assertIs(first._base_cmd, second._base_cmd)
+        self.assertEqual(first._build_command("Hi"), second._build_command("Hi"))
     
-    def test_parse_event_user(self):
-        """Test parsing user event."""
+    @patch('cursor_agent_api.client.shutil.which')
+    def test_binary_resolved_once(self, mock_which):
+        """Test the agent binary is looked up on PATH once per config."""
+        mock_which.return_value = "/opt/bin/agent"
         client = CursorAgentClient()
-        line = '{"type": "user", "message": {"role": "user", "content": [{"type": "text", "text": "Hello"}]}}'
         
-        event = client._parse_event(line)
+        cmd1 = client._build_command("Hi")
+        cmd2 = client._build_command("Hi", output_format=OutputFormat.STREAM_JSON)
         
-        self.assertEqual(event.type, EventType.USER)
-        self.assertEqual(event.text, "Hello")
+        self.assertEqual(cmd1[0], "/opt/bin/agent")
+        self.assertEqual(cmd2[0], "/opt/bin/agent")
+        mock_which.assert_called_once_with("agent")
     
-    def test_parse_event_thinking_delta(self):
-        """Test parsing thinking delta event."""
-        client = CursorAgentClient()
-        line = '{"type": "thinking", "subtype": "delta", "text": "Thinking...", "timestamp_ms": 123}'
+    @patch('cursor_agent_api.client.shutil.which')
+    def test_binary_resolved_once_across_clients(self, mock_which):
+        """Test clients share the PATH lookup until PATH changes."""
+        mock_which.return_value = "/opt/bin/agent"
         
-        event = client._parse_event(line)
+        CursorAgentClient()
+        CursorAgentClient(AgentConfig(model="gpt-4"))
+        self.assertEqual(mock_which.call_count, 1)
         
-        self.assertEqual(event.type, EventType.THINKING_DELTA)
-        self.assertEqual(event.text, "Thinking...")
+        with patch.dict(os.environ, {"PATH": "/somewhere/else"}):
+            CursorAgentClient()
+        self.assertEqual(mock_which.call_count, 2)
     
-    def test_parse_event_thinking_completed(self):
-        """Test parsing thinking completed event."""
-        client = CursorAgentClient()
-        line = '{"type": "thinking", "subtype": "completed"}'
+    @patch('cursor_agent_api.client.shutil.which')
+    def test_binary_not_found_kept_as_is(self, mock_which):
+        """Test an unresolvable binary is passed through unchanged."""
+        mock_which.return_value = None
+        client = CursorAgentClient(AgentConfig(agent_binary="missing-agent"))
         
-        event = client._parse_event(line)
+        self.assertEqual(client._build_command("Hi")[0], "missing-agent")
         
-        self.assertEqual(event.type, EventType.THINKING_COMPLETED)
+        # Misses are not cached, so a later install is found
+        mock_which.return_value = "/opt/bin/missing-agent"
+        client = CursorAgentClient(AgentConfig(agent_binary="missing-agent"))
+        self.assertEqual(client._build_command("Hi")[0], "/opt/bin/missing-agent")
     
-    def test_parse_event_assistant_delta(self):
-        """Test parsing assistant delta event (with timestamp)."""
-        client = CursorAgentClient()
-        line = '{"type": "assistant", "text": "Hello", "timestamp_ms": 123}'
+    def test_build_command_after_config_change(self):
+        """Test assigning a new config rebuilds the base command."""
+        client = CursorAgentClient(AgentConfig(model="gpt-4"))
+        client.config = AgentConfig(model="sonnet-4")
         
-        event = client._parse_event(line)
+        cmd = client._build_command("Hi")
         
-        self.assertEqual(event.type, EventType.ASSISTANT_DELTA)
-        self.assertEqual(event.text, "Hello")
-        self.assertEqual(event.timestamp_ms, 123)
+        self.assertIn("sonnet-4", cmd)
+        self.assertNotIn("gpt-4", cmd)
     
-    def test_parse_event_assistant_complete(self):
-        """Test parsing assistant complete event (without timestamp)."""
-        client = CursorAgentClient()
-        line = '{"type": "assistant", "message": {"role": "assistant", "content": [{"type": "text", "text": "Hi there"}]}}'
+    def test_build_command_stream_partial_only_with_stream_json(self):
+        """Test stream_partial flag only added with STREAM_JSON format."""
+        client = self.default_client
         
-        event = client._parse_event(line)
+        # With STREAM_JSON
+        cmd1 = client._build_command("Hi", output_format=OutputFormat.STREAM_JSON, stream_partial=True)
+        self.assertIn("--stream-partial-output", cmd1)
         
-        self.assertEqual(event.type, EventType.ASSISTANT)
-        self.assertEqual(event.text, "Hi there")
+        # With JSON (should not include)
+        cmd2 = client._build_command("Hi", output_format=OutputFormat.JSON, stream_partial=True)
+        self.assertNotIn("--stream-partial-output", cmd2)
     
-    def test_parse_event_tool_call_started(self):
-        """Test parsing tool call started event."""
-        client = CursorAgentClient()
-        line = '{"type": "tool-call-started", "tool_name": "Shell", "parameters": {"command": "ls"}}'
+    def test_parse_event_system_init(self):
+        """Test parsing system init event."""
+        client = self.default_client
+        line = '{"type": "system", "subtype": "init", "session_id": "abc-123"}'
         
         event = client._parse_event(line)
         
-        self.assertEqual(event.type, EventType.TOOL_CALL_STARTED)
+        self.assertEqual(event.type, EventType.SYSTEM_INIT)
+        self.assertEqual(event.raw_type, "system")
+        self.assertEqual(event.subtype, "init")
+        self.assertEqual(event.session_id, "abc-123")
     
-    def test_parse_event_tool_call_completed(self):
-        """Test parsing tool call completed event."""
-        client = CursorAgentClient()
-        line = '{"type": "tool-call-completed", "tool_name": "Shell", "result": {"output": "file.txt"}}'
+    def test_parse_event_types(self):
+        """Test each kind of stream line maps to its event type and text."""
+        client = self.default_client
+        
+        for line, event_type, text in _PARSE_EVENT_CASES:
+            with self.subTest(line=line):
+                event = client._parse_event(line)
+                data = json.loads(line)
+                
+                self.assertEqual(event.type, event_type)
+                self.assertEqual(event.raw_type, data["type"])
+                self.assertEqual(event.timestamp_ms, data.get("timestamp_ms"))
+                if text is not None:
+                    self.assertEqual(event.text, text)
+    
+    def test_parse_event_drop_raw_data(self):
+        """Test keep_raw_data=False drops data but keeps extracted fields."""
+        client = CursorAgentClient(AgentConfig(keep_raw_data=False))
+        line = '{"type": "assistant", "text": "Hi", "session_id": "s", "timestamp_ms": 5}'
         
         event = client._parse_event(line)
         
-        self.assertEqual(event.type, EventType.TOOL_CALL_COMPLETED)
+        self.assertEqual(event.data, {})
+        self.assertEqual(event.type, EventType.ASSISTANT_DELTA)
+        self.assertEqual(event.text, "Hi")
+        self.assertEqual(event.session_id, "s")
+        self.assertEqual(event.timestamp_ms, 5)
     
-    def test_parse_event_result_success(self):
-        """Test parsing result success event."""
-        client = CursorAgentClient()
-        line = '{"type": "result", "subtype": "success", "result": "Done!", "session_id": "abc"}'
+    def test_parse_event_shares_empty_unknown_events(self):
+        """Test payload-free unknown events are shared when raw data is dropped."""
+        client = CursorAgentClient(AgentConfig(keep_raw_data=False))
         
-        event = client._parse_event(line)
+        first = client._parse_event('{"type": "heartbeat"}')
+        second = client._parse_event('{"type": "heartbeat", "seq": 2}')
+        other = client._parse_event('{"type": "ping"}')
+        with_session = client._parse_event('{"type": "heartbeat", "session_id": "s"}')
         
-        self.assertEqual(event.type, EventType.RESULT_SUCCESS)
-        self.assertEqual(event.text, "Done!")
+        self.assertIs(first, second)
+        self.assertEqual(first.type, EventType.UNKNOWN)
+        self.assertEqual(first.raw_type, "heartbeat")
+        self.assertEqual(other.raw_type, "ping")
+        self.assertIsNot(with_session, first)
+        self.assertEqual(with_session.session_id, "s")
     
-    def test_parse_event_result_error(self):
-        """Test parsing result error event."""
-        client = CursorAgentClient()
-        line = '{"type": "result", "subtype": "error", "error": "Failed"}'
+    def test_parse_event_unknown_not_shared_with_raw_data(self):
+        """Test unknown events keep their own data by default."""
+        client = self.default_client
         
-        event = client._parse_event(line)
+        first = client._parse_event('{"type": "heartbeat", "seq": 1}')
+        second = client._parse_event('{"type": "heartbeat", "seq": 2}')
         
-        self.assertEqual(event.type, EventType.RESULT_ERROR)
+        self.assertIsNot(first, second)
+        self.assertEqual(second.data["seq"], 2)
     
-    def test_parse_event_unknown(self):
-        """Test parsing unknown event type."""
-        client = CursorAgentClient()
-        line = '{"type": "custom_event", "data": "something"}'
+    def test_parse_event_bytes(self):
+        """Test parsing a raw bytes line from a binary pipe."""
+        client = self.default_client
+        line = '{"type": "assistant", "text": "h\u00e9", "timestamp_ms": 1}\n'.encode("utf-8")
         
         event = client._parse_event(line)
         
-        self.assertEqual(event.type, EventType.UNKNOWN)
+        self.assertEqual(event.type, EventType.ASSISTANT_DELTA)
+        self.assertEqual(event.text, "h\u00e9")
     
     def test_parse_event_invalid_json(self):
         """Test parsing invalid JSON returns None."""
-        client = CursorAgentClient()
+        client = self.default_client
         line = 'not valid json'
         
         event = client._parse_event(line)
         
         self.assertIsNone(event)
     
-    @patch('cursor_agent_api.client.subprocess.run')
-    def test_query_success(self, mock_run):
+    def test_query_success(self):
         """Test successful query."""
-        mock_run.return_value = Mock(
+        self._set_run_result(
             returncode=0,
-            stdout='{"type": "result", "subtype": "success", "result": "4", "session_id": "abc", "request_id": "req", "duration_ms": 100, "duration_api_ms": 90}',
-            stderr='',
+            stdout=b'{"type": "result", "subtype": "success", "result": "4", "session_id": "abc", "request_id": "req", "duration_ms": 100, "duration_api_ms": 90}',
+            stderr=b'',
         )
         
         client = CursorAgentClient()
         result = client.query("What is 2+2?")
         
+        self.assertEqual(self.mock_run.call_args[1]["input"], b"What is 2+2?")
+        self.assertNotIn("text", self.mock_run.call_args[1])
+        self.assertFalse(self.mock_run.call_args[1]["close_fds"])
         self.assertTrue(result.success)
         self.assertEqual(result.result, "4")
         self.assertEqual(result.session_id, "abc")
         self.assertEqual(result.request_id, "req")
         self.assertEqual(result.duration_ms, 100)
     
-    @patch('cursor_agent_api.client.subprocess.run')
-    def test_query_error_return_code(self, mock_run):
-        """Test query with non-zero return code."""
-        mock_run.return_value = Mock(
-            returncode=1,
-            stdout='',
-            stderr='Error message',
-        )
-        
+    def test_query_failures(self):
+        """Test each way a query can fail is reported in the result."""
         client = CursorAgentClient()
-        result = client.query("test")
+        for case in _QUERY_FAILURE_CASES:
+            returncode, stdout, stderr, side_effect, error = case
+            with self.subTest(error=error):
+                self.mock_run.side_effect = side_effect
+                self._set_run_result(returncode, stdout, stderr)
+                
+                result = client.query("test", timeout=30)
+                
+                self.assertFalse(result.success)
+                self.assertIn(error, result.error)
+    
+    def test_query_without_fast_spawn(self):
+        """Test fast_spawn=False keeps closing inherited fds."""
+        self._set_run_result(returncode=0, stdout=b'{"subtype": "success"}', stderr=b'')
+        
+        client = CursorAgentClient(AgentConfig(fast_spawn=False))
+        client.query("test")
+        
+        self.assertTrue(self.mock_run.call_args[1]["close_fds"])
+    
+    @unittest.skipIf(client_module.ijson is None, "ijson not installed")
+    @patch('cursor_agent_api.client.subprocess.Popen')
+    def test_query_incremental_parse(self, mock_popen):
+        """Test incremental_parse reads the result object from the pipe."""
+        process = Mock()
+        process.stdout = BytesIO(b'{"type": "result", "subtype": "success", "result": "4", "session_id": "abc", "duration_ms": 100}\n')
+        process.wait.return_value = 0
+        process.poll.return_value = 0
+        mock_popen.return_value = process
         
-        self.assertFalse(result.success)
-        self.assertEqual(result.error, "Error message")
+        client = CursorAgentClient(AgentConfig(incremental_parse=True))
+        result = client.query("What is 2+2?")
+        
+        self.assertTrue(result.success)
+        self.assertEqual(result.result, "4")
+        self.assertEqual(result.session_id, "abc")
+        self.assertEqual(result.duration_ms, 100)
+        process.stdin.write.assert_called_once_with(b"What is 2+2?")
     
-    @patch('cursor_agent_api.client.subprocess.run')
-    def test_query_invalid_json_response(self, mock_run):
-        """Test query with invalid JSON response."""
-        mock_run.return_value = Mock(
-            returncode=0,
-            stdout='not valid json',
-            stderr='',
-        )
+    @unittest.skipIf(client_module.ijson is None, "ijson not installed")
+    @patch('cursor_agent_api.client.subprocess.Popen')
+    def test_query_incremental_parse_invalid_json(self, mock_popen):
+        """Test incremental_parse reports malformed output."""
+        process = Mock()
+        process.stdout = BytesIO(b'not valid json')
+        process.wait.return_value = 0
+        process.poll.return_value = 0
+        mock_popen.return_value = process
         
-        client = CursorAgentClient()
+        client = CursorAgentClient(AgentConfig(incremental_parse=True))
         result = client.query("test")
         
         self.assertFalse(result.success)
         self.assertIn("Failed to parse JSON", result.error)
     
-    @patch('cursor_agent_api.client.subprocess.run')
-    def test_query_timeout(self, mock_run):
-        """Test query with timeout."""
-        mock_run.side_effect = subprocess.TimeoutExpired("cmd", 30)
-        
-        client = CursorAgentClient()
-        result = client.query("test", timeout=30)
-        
-        self.assertFalse(result.success)
-        self.assertEqual(result.error, "Request timed out")
-    
-    @patch('cursor_agent_api.client.subprocess.run')
-    def test_query_exception(self, mock_run):
-        """Test query with exception."""
-        mock_run.side_effect = Exception("Connection failed")
+    @patch('cursor_agent_api.client.ijson', None)
+    def test_query_incremental_parse_without_ijson(self):
+        """Test incremental_parse falls back to subprocess.run without ijson."""
+        self._set_run_result(returncode=0, stdout=b'{"subtype": "success", "result": "ok"}', stderr=b'')
         
-        client = CursorAgentClient()
+        client = CursorAgentClient(AgentConfig(incremental_parse=True))
         result = client.query("test")
         
-        self.assertFalse(result.success)
-        self.assertEqual(result.error, "Connection failed")
+        self.assertEqual(result.result, "ok")
+        self.mock_run.assert_called_once()
     
-    @patch('cursor_agent_api.client.subprocess.run')
-    def test_query_with_mode(self, mock_run):
+    def test_query_with_mode(self):
         """Test query with mode parameter."""
-        mock_run.return_value = Mock(
+        self._set_run_result(
             returncode=0,
-            stdout='{"type": "result", "subtype": "success", "result": "ok", "session_id": "abc"}',
-            stderr='',
+            stdout=b'{"type": "result", "subtype": "success", "result": "ok", "session_id": "abc"}',
+            stderr=b'',
         )
         
         client = CursorAgentClient()
         client.query("test", mode="plan")
         
-        call_args = mock_run.call_args
+        call_args = self.mock_run.call_args
         cmd = call_args[0][0]
         self.assertIn("--mode", cmd)
         self.assertIn("plan", cmd)
     
+    def _warm_process(self, result="pooled"):
+        process = Mock()
+        process.poll.return_value = None
+        process.returncode = 0
+        process.communicate.return_value = (
+            json.dumps({"type": "result", "subtype": "success", "result": result}).encode(),
+            b'',
+        )
+        return process
+    
+    @patch.object(CursorAgentClient, '_start_query')
+    def test_query_pool(self, mock_start_query):
+        """Test pool_size pre-starts processes and fresh queries use them."""
+        first, second = self._warm_process("first"), self._warm_process("second")
+        mock_start_query.side_effect = [first, second]
+        
+        client = CursorAgentClient(pool_size=1)
+        self.assertEqual(mock_start_query.call_count, 1)
+        
+        result = client.query("Hello")
+        
+        self.assertEqual(result.result, "first")
+        first.communicate.assert_called_once_with(b"Hello", timeout=None)
+        self.mock_run.assert_not_called()
+        # The claimed process was replaced straight away
+        self.assertEqual(mock_start_query.call_count, 2)
+        
+        client.close()
+        second.kill.assert_called_once()
+    
+    @patch.object(CursorAgentClient, '_start_query')
+    def test_query_pool_skips_resumed_queries(self, mock_start_query):
+        """Test queries with a session or mode do not use the pool."""
+        mock_start_query.return_value = self._warm_process()
+        self._set_run_result(returncode=0, stdout=b'{"subtype": "success", "result": "ok"}', stderr=b'')
+        
+        with CursorAgentClient(pool_size=1) as client:
+            client.query("Hi", session_id="abc")
+            client.query("Hi", mode="plan")
+        
+        self.assertEqual(self.mock_run.call_count, 2)
+        mock_start_query.return_value.communicate.assert_called_once_with()
+    
+    @patch.object(CursorAgentClient, '_start_query')
+    def test_query_pool_skips_exited_process(self, mock_start_query):
+        """Test a pooled process that already exited is not used."""
+        dead, live = self._warm_process("dead"), self._warm_process("live")
+        dead.poll.return_value = 1
+        # The most recently started process is claimed first
+        mock_start_query.side_effect = [live, dead] + [self._warm_process() for _ in range(2)]
+        
+        client = CursorAgentClient(pool_size=2)
+        result = client.query("Hello")
+        
+        self.assertEqual(result.result, "live")
+        dead.communicate.assert_called_once_with()
+    
+    @patch.object(CursorAgentClient, '_start_query')
+    def test_query_pool_refreshed_on_config_change(self, mock_start_query):
+        """Test replacing the config restarts the pooled processes."""
+        old, new = self._warm_process(), self._warm_process()
+        mock_start_query.side_effect = [old, new]
+        
+        client = CursorAgentClient(pool_size=1)
+        client.config = AgentConfig(model="gpt-4")
+        
+        old.kill.assert_called_once()
+        self.assertEqual(client._warm_pool, [new])
+        client.close()
+    
+    @patch.object(CursorAgentClient, '_start_query')
+    def test_query_pool_stopped_when_client_collected(self, mock_start_query):
+        """Test pooled processes are killed when an unclosed client is collected."""
+        pooled = self._warm_process()
+        mock_start_query.return_value = pooled
+        
+        client = CursorAgentClient(pool_size=1)
+        del client
+        gc.collect()
+        
+        pooled.kill.assert_called_once()
+        pooled.communicate.assert_called_once_with()
+    
+    def test_finish_query_timeout(self):
+        """Test _finish_query kills the process on timeout."""
+        process = Mock()
+        process.communicate.side_effect = [subprocess.TimeoutExpired("cmd", 1), (b'', b'')]
+        
+        client = CursorAgentClient()
+        result = client._finish_query(process, "test", timeout=1, session_id="abc")
+        
+        self.assertFalse(result.success)
+        self.assertEqual(result.error, "Request timed out")
+        self.assertEqual(result.session_id, "abc")
+        process.kill.assert_called_once()
+    
     @patch('cursor_agent_api.client.subprocess.Popen')
     def test_query_stream(self, mock_popen):
         """Test streaming query."""
         mock_process = Mock()
         mock_process.stdin = Mock()
-        mock_process.stdout = StringIO('{"type": "assistant", "text": "Hi", "timestamp_ms": 123}\n')
+        mock_process.stdout = BytesIO(_ASSISTANT_HI_LINE)
         mock_process.stderr = Mock()
         mock_process.poll.return_value = None
         mock_process.wait.return_value = 0
@@ -686,15 +1072,16 @@ class TestCursorAgentClient(unittest.TestCase):
         stream = client.query_stream("Hello")
         
         self.assertIsInstance(stream, StreamingResponse)
+        mock_process.stdin.write.assert_called_once_with(b"Hello")
+        self.assertNotIn("text", mock_popen.call_args[1])
         
         events = list(stream)
         self.assertEqual(len(events), 1)
         self.assertEqual(events[0].text, "Hi")
     
-    @patch('cursor_agent_api.client.subprocess.run')
-    def test_create_session(self, mock_run):
+    def test_create_session(self):
         """Test creating a new session."""
-        mock_run.return_value = Mock(
+        self._set_run_result(
             returncode=0,
             stdout='abc-123-session\n',
             stderr='',
@@ -704,14 +1091,13 @@ class TestCursorAgentClient(unittest.TestCase):
         session_id = client.create_session()
         
         self.assertEqual(session_id, "abc-123-session")
-        mock_run.assert_called_once()
-        cmd = mock_run.call_args[0][0]
+        self.mock_run.assert_called_once()
+        cmd = self.mock_run.call_args[0][0]
         self.assertIn("create-chat", cmd)
     
-    @patch('cursor_agent_api.client.subprocess.run')
-    def test_list_models(self, mock_run):
+    def test_list_models(self):
         """Test listing models."""
-        mock_run.return_value = Mock(
+        self._set_run_result(
             returncode=0,
             stdout='gpt-4\nsonnet-4\nclaude-3\n',
             stderr='',
@@ -721,9 +1107,75 @@ class TestCursorAgentClient(unittest.TestCase):
         models = client.list_models()
         
         self.assertEqual(models, ['gpt-4', 'sonnet-4', 'claude-3'])
-        mock_run.assert_called_once()
-        cmd = mock_run.call_args[0][0]
+        self.mock_run.assert_called_once()
+        cmd = self.mock_run.call_args[0][0]
         self.assertIn("--list-models", cmd)
+    
+    def test_list_models_cached(self):
+        """Test list_models reuses a fresh cached result."""
+        self._set_run_result(returncode=0, stdout='gpt-4\n', stderr='')
+        
+        models = CursorAgentClient().list_models()
+        models.append("mutated")
+        
+        self.assertEqual(CursorAgentClient().list_models(), ['gpt-4'])
+        self.mock_run.assert_called_once()
+        
+        CursorAgentClient.invalidate_models_cache()
+        CursorAgentClient().list_models()
+        self.assertEqual(self.mock_run.call_count, 2)
+    
+    @patch('cursor_agent_api.client.time.monotonic')
+    def test_list_models_cache_expires(self, mock_monotonic):
+        """Test list_models re-runs the CLI after the TTL."""
+        self._set_run_result(returncode=0, stdout='gpt-4\n', stderr='')
+        mock_monotonic.return_value = 1000.0
+        
+        client = CursorAgentClient()
+        client.list_models()
+        mock_monotonic.return_value = 1000.0 + MODELS_CACHE_TTL
+        client.list_models()
+        
+        self.assertEqual(self.mock_run.call_count, 2)
+    
+    def test_list_models_failure_not_cached(self):
+        """Test a failed list_models call is not cached."""
+        self._set_run_result(returncode=1, stdout='', stderr='error')
+        
+        client = CursorAgentClient()
+        self.assertEqual(client.list_models(), [])
+        client.list_models()
+        
+        self.assertEqual(self.mock_run.call_count, 2)
+
+
+class _FakeStream:
+    """Stand-in StreamingResponse holding already parsed events."""
+    
+    __slots__ = ("events",)
+    
+    def __init__(self, events=()):
+        self.events = list(events)
+    
+    def __iter__(self):
+        return iter(self.events)
+
+
+class _FakeQueryClient:
+    """
+    Stand-in client for ConversationSession tests that only send().
+    
+    query() returns the given results in turn and records each call as
+    (prompt, kwargs) in calls, so no CursorAgentClient method is patched.
+    """
+    
+    def __init__(self, *results):
+        self._results = iter(results)
+        self.calls = []
+    
+    def query(self, prompt, **kwargs):
+        self.calls.append((prompt, kwargs))
+        return next(self._results)
 
 
 class TestConversationSession(unittest.TestCase):
@@ -750,16 +1202,13 @@ class TestConversationSession(unittest.TestCase):
         
         self.assertEqual(session.session_id, "abc-123")
     
-    @patch.object(CursorAgentClient, 'query')
-    def test_send(self, mock_query):
+    def test_send(self):
         """Test sending a message."""
-        mock_query.return_value = AgentResult(
-            success=True,
-            result="Hello!",
-            session_id="new-session",
+        client = _FakeQueryClient(
+            AgentResult(success=True, result="Hello!", session_id="new-session"),
         )
         
-        session = ConversationSession()
+        session = ConversationSession(client=client)
         result = session.send("Hi")
         
         self.assertTrue(result.success)
@@ -768,27 +1217,26 @@ class TestConversationSession(unittest.TestCase):
         self.assertEqual(len(session.history), 1)
         self.assertEqual(session.history[0], ("Hi", result))
     
-    @patch.object(CursorAgentClient, 'query')
-    def test_send_maintains_session(self, mock_query):
+    def test_send_maintains_session(self):
         """Test session ID is maintained across calls."""
-        mock_query.side_effect = [
+        client = _FakeQueryClient(
             AgentResult(success=True, result="Hi", session_id="sess-1"),
             AgentResult(success=True, result="Bye", session_id="sess-1"),
-        ]
+        )
         
-        session = ConversationSession()
+        session = ConversationSession(client=client)
         session.send("Hello")
         session.send("Goodbye")
         
         # Second call should use session_id from first call
-        self.assertEqual(mock_query.call_count, 2)
-        second_call = mock_query.call_args_list[1]
-        self.assertEqual(second_call[1]['session_id'], "sess-1")
+        self.assertEqual(len(client.calls), 2)
+        prompt, kwargs = client.calls[1]
+        self.assertEqual(kwargs['session_id'], "sess-1")
     
     @patch.object(CursorAgentClient, 'query_stream')
     def test_send_stream(self, mock_query_stream):
         """Test streaming send."""
-        mock_stream = Mock(spec=StreamingResponse)
+        mock_stream = _FakeStream()
         mock_query_stream.return_value = mock_stream
         
         session = ConversationSession()
@@ -799,8 +1247,7 @@ class TestConversationSession(unittest.TestCase):
     @patch.object(CursorAgentClient, 'query_stream')
     def test_finalize_stream(self, mock_query_stream):
         """Test finalizing stream updates history."""
-        mock_stream = Mock(spec=StreamingResponse)
-        mock_stream.events = [
+        mock_stream = _FakeStream([
             AgentEvent(
                 type=EventType.SYSTEM_INIT,
                 raw_type="system",
@@ -815,7 +1262,7 @@ class TestConversationSession(unittest.TestCase):
                 data={"result": "Done"},
                 text="Done",
             ),
-        ]
+        ])
         mock_query_stream.return_value = mock_stream
         
         session = ConversationSession()
@@ -827,11 +1274,24 @@ class TestConversationSession(unittest.TestCase):
         self.assertTrue(result.success)
         self.assertEqual(result.result, "Done")
     
+    def test_finalize_stream_uses_latest_session_id(self):
+        """Test the last event carrying a session ID wins."""
+        stream = _FakeStream([
+            AgentEvent(type=EventType.SYSTEM_INIT, raw_type="system", subtype="init", data={}, session_id="old"),
+            AgentEvent(type=EventType.RESULT_ERROR, raw_type="result", subtype="error", data={}, session_id="new"),
+        ])
+        
+        session = ConversationSession()
+        result = session.finalize_stream("Hello", stream)
+        
+        self.assertFalse(result.success)
+        self.assertEqual(session.session_id, "new")
+        self.assertEqual(result.session_id, "new")
+    
     @patch.object(CursorAgentClient, 'query_stream')
     def test_finalize_stream_no_result(self, mock_query_stream):
         """Test finalizing stream with no result event."""
-        mock_stream = Mock(spec=StreamingResponse)
-        mock_stream.events = [
+        mock_stream = _FakeStream([
             AgentEvent(
                 type=EventType.ASSISTANT_DELTA,
                 raw_type="assistant",
@@ -839,7 +1299,7 @@ class TestConversationSession(unittest.TestCase):
                 data={},
                 text="Hi",
             ),
-        ]
+        ])
         
         session = ConversationSession()
         result = session.finalize_stream("Hello", mock_stream)
@@ -847,6 +1307,63 @@ class TestConversationSession(unittest.TestCase):
         self.assertIsNone(result)
         self.assertEqual(len(session.history), 0)
     
+    @patch.object(CursorAgentClient, '_start_query')
+    @patch.object(CursorAgentClient, 'query')
+    def test_send_prewarm_reuses_process(self, mock_query, mock_start_query):
+        """Test prewarm starts the next turn's process and uses it."""
+        mock_query.return_value = AgentResult(success=True, result="Hi", session_id="sess-1")
+        warm = Mock()
+        warm.poll.return_value = None
+        warm.returncode = 0
+        warm.communicate.return_value = (
+            b'{"type": "result", "subtype": "success", "result": "Bye", "session_id": "sess-1"}',
+            b'',
+        )
+        mock_start_query.return_value = warm
+        
+        session = ConversationSession(prewarm=True)
+        session.send("Hello")
+        mock_start_query.assert_called_once_with("sess-1", None)
+        
+        result = session.send("Goodbye")
+        
+        self.assertEqual(result.result, "Bye")
+        self.assertEqual(mock_query.call_count, 1)
+        warm.communicate.assert_called_once_with(b"Goodbye", timeout=None)
+        self.assertEqual(len(session.history), 2)
+    
+    @patch.object(CursorAgentClient, '_start_query')
+    @patch.object(CursorAgentClient, 'query')
+    def test_send_prewarm_mode_mismatch_discards_process(self, mock_query, mock_start_query):
+        """Test a pre-started process is killed if the next turn uses another mode."""
+        mock_query.return_value = AgentResult(success=True, result="Hi", session_id="sess-1")
+        warm = Mock()
+        warm.poll.return_value = None
+        warm.communicate.return_value = (b'', b'')
+        mock_start_query.return_value = warm
+        
+        with ConversationSession(prewarm=True) as session:
+            session.send("Hello")
+            session.send("Plan it", mode="plan")
+            
+            warm.kill.assert_called_once()
+            self.assertEqual(mock_query.call_count, 2)
+            self.assertEqual(mock_query.call_args[1]["mode"], "plan")
+        
+        # Leaving the context kills the process started for the next turn
+        self.assertEqual(warm.kill.call_count, 2)
+    
+    @patch.object(CursorAgentClient, '_start_query')
+    @patch.object(CursorAgentClient, 'query')
+    def test_send_without_prewarm_does_not_prestart(self, mock_query, mock_start_query):
+        """Test the default session never pre-starts processes."""
+        mock_query.return_value = AgentResult(success=True, result="Hi", session_id="sess-1")
+        
+        session = ConversationSession()
+        session.send("Hello")
+        
+        mock_start_query.assert_not_called()
+    
     def test_reset(self):
         """Test resetting session."""
         session = ConversationSession(session_id="abc-123")
@@ -857,25 +1374,102 @@ class TestConversationSession(unittest.TestCase):
         self.assertIsNone(session.session_id)
         self.assertEqual(session.history, [])
     
-    def test_history_returns_copy(self):
-        """Test history property returns a copy."""
+    def test_history_returns_view(self):
+        """Test history property returns a read-only view."""
         session = ConversationSession()
         session._history = [("Hi", Mock())]
         
         history = session.history
-        history.append(("Bye", Mock()))
         
-        self.assertEqual(len(session.history), 1)
+        self.assertFalse(hasattr(history, "append"))
+        self.assertEqual(len(history), 1)
+        self.assertEqual(history[0][0], "Hi")
+        
+        # The view tracks later appends without re-copying
+        session._history.append(("Bye", Mock()))
+        self.assertEqual(len(history), 2)
+    
+    def test_history_limit(self):
+        """Test history_limit keeps only the most recent turns."""
+        ok = AgentResult(success=True, result="OK", session_id="sess-1")
+        client = _FakeQueryClient(*[ok] * 6)
+        
+        session = ConversationSession(client=client, history_limit=2)
+        for prompt in ("one", "two", "three"):
+            session.send(prompt)
+        
+        history = session.history
+        self.assertEqual([h[0] for h in history], ["two", "three"])
+        self.assertEqual(history[0][0], "two")
+        self.assertEqual([h[0] for h in history[-1:]], ["three"])
+        self.assertEqual(history, [("two", ok), ("three", ok)])
+        # The session itself is unaffected
+        self.assertEqual(session.session_id, "sess-1")
+        
+        session.reset()
+        for prompt in ("a", "b", "c"):
+            session.send(prompt)
+        self.assertEqual(len(session.history), 2)
+
+
+def _create_async_process(stdout=b"", stderr=b"", returncode=0, stdout_lines=()):
+    """Helper to create a mock asyncio subprocess."""
+    async def lines():
+        for line in stdout_lines:
+            yield line
+    
+    process = Mock()
+    process.returncode = returncode
+    process.stdin = Mock()
+    process.stdin.drain = AsyncMock()
+    process.stdout = lines()
+    process.communicate = AsyncMock(return_value=(stdout, stderr))
+    process.wait = AsyncMock(return_value=returncode)
+    return process
+
+
+def _swap_attr(test, obj, name, value):
+    """
+    Set obj.name to value until the test ends.
+    
+    A plain attribute swap for stubs whose calls need no asserting;
+    cheaper than patch.object, which builds a MagicMock.
+    """
+    test.addCleanup(setattr, obj, name, getattr(obj, name))
+    setattr(obj, name, value)
+
 
+class _SharedLoopMixin:
+    """
+    Runs a TestCase's coroutines on one event loop kept for the class,
+    instead of building and tearing one down with asyncio.run() per test.
+    """
+    
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.loop = asyncio.new_event_loop()
+    
+    @classmethod
+    def tearDownClass(cls):
+        loop = cls.loop
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.run_until_complete(loop.shutdown_default_executor())
+        loop.close()
+        super().tearDownClass()
+    
+    def run_async(self, coro):
+        return self.loop.run_until_complete(coro)
 
-class TestAsyncCursorAgentClient(unittest.TestCase):
+
+class TestAsyncCursorAgentClient(_SharedLoopMixin, unittest.TestCase):
     """Tests for AsyncCursorAgentClient class."""
     
     def test_init_default(self):
         """Test default initialization."""
         client = AsyncCursorAgentClient()
         self.assertIsNotNone(client._sync_client)
-        self.assertIsNotNone(client._executor)
+        self.assertFalse(hasattr(client, "_executor"))
     
     def test_init_with_config(self):
         """Test initialization with config."""
@@ -883,40 +1477,77 @@ class TestAsyncCursorAgentClient(unittest.TestCase):
         client = AsyncCursorAgentClient(config)
         self.assertEqual(client._sync_client.config.model, "gpt-4")
     
-    @patch.object(CursorAgentClient, 'query')
-    def test_async_query(self, mock_query):
+    @patch('cursor_agent_api.client.asyncio.create_subprocess_exec')
+    def test_async_query(self, mock_exec):
         """Test async query."""
-        import asyncio
-        
-        mock_query.return_value = AgentResult(
-            success=True,
-            result="4",
-            session_id="abc",
+        process = _create_async_process(
+            stdout=b'{"type": "result", "subtype": "success", "result": "4", "session_id": "abc"}',
         )
+        mock_exec.return_value = process
         
         client = AsyncCursorAgentClient()
         
         async def run_test():
-            return await client.query("What is 2+2?")
+            return await client.query("What is 2+2?", mode="plan")
         
-        result = asyncio.run(run_test())
+        result = self.run_async(run_test())
         
         self.assertTrue(result.success)
         self.assertEqual(result.result, "4")
+        self.assertEqual(result.session_id, "abc")
+        process.communicate.assert_awaited_once_with(b"What is 2+2?")
+        cmd = mock_exec.call_args[0]
+        self.assertIn("json", cmd)
+        self.assertIn("plan", cmd)
     
-    @patch.object(CursorAgentClient, 'query_stream')
-    def test_async_query_stream(self, mock_query_stream):
-        """Test async query stream."""
-        import asyncio
+    @patch('cursor_agent_api.client.asyncio.create_subprocess_exec')
+    def test_async_query_error_return_code(self, mock_exec):
+        """Test async query with non-zero return code."""
+        mock_exec.return_value = _create_async_process(stderr=b"Error message", returncode=1)
         
-        # Create mock events
-        mock_events = [
-            AgentEvent(type=EventType.ASSISTANT_DELTA, raw_type="assistant", subtype=None, data={}, text="Hi"),
-        ]
+        client = AsyncCursorAgentClient()
+        result = self.run_async(client.query("test"))
         
-        mock_stream = Mock(spec=StreamingResponse)
-        mock_stream.__iter__ = Mock(return_value=iter(mock_events))
-        mock_query_stream.return_value = mock_stream
+        self.assertFalse(result.success)
+        self.assertEqual(result.error, "Error message")
+    
+    @patch('cursor_agent_api.client.asyncio.create_subprocess_exec')
+    def test_async_query_timeout(self, mock_exec):
+        """Test async query timeout kills the process."""
+        async def never_finishes(*args):
+            await asyncio.sleep(10)
+        
+        process = _create_async_process(returncode=None)
+        process.communicate.side_effect = never_finishes
+        mock_exec.return_value = process
+        
+        client = AsyncCursorAgentClient()
+        result = self.run_async(client.query("test", timeout=0.01))
+        
+        self.assertFalse(result.success)
+        self.assertEqual(result.error, "Request timed out")
+        process.kill.assert_called_once()
+    
+    @patch('cursor_agent_api.client.asyncio.create_subprocess_exec')
+    def test_async_query_exception(self, mock_exec):
+        """Test async query when the binary cannot be started."""
+        mock_exec.side_effect = FileNotFoundError("agent not found")
+        
+        client = AsyncCursorAgentClient()
+        result = self.run_async(client.query("test"))
+        
+        self.assertFalse(result.success)
+        self.assertEqual(result.error, "agent not found")
+    
+    @patch('cursor_agent_api.client.asyncio.create_subprocess_exec')
+    def test_async_query_stream(self, mock_exec):
+        """Test async query stream."""
+        process = _create_async_process(stdout_lines=[
+            _ASSISTANT_HI_LINE,
+            b'\n',
+            b'{"type": "result", "subtype": "success", "result": "Hi"}\n',
+        ])
+        mock_exec.return_value = process
         
         client = AsyncCursorAgentClient()
         collected = []
@@ -924,16 +1555,38 @@ class TestAsyncCursorAgentClient(unittest.TestCase):
         async def run_test():
             return await client.query_stream("Hello", callback=lambda e: collected.append(e))
         
-        events = asyncio.run(run_test())
+        events = self.run_async(run_test())
         
-        self.assertEqual(len(events), 1)
-        self.assertEqual(len(collected), 1)
+        self.assertEqual([e.type for e in events], [EventType.ASSISTANT_DELTA, EventType.RESULT_SUCCESS])
+        self.assertEqual(collected, events)
+        process.stdin.write.assert_called_once_with(b"Hello")
+        self.assertIn("--stream-partial-output", mock_exec.call_args[0])
+    
+    @patch('cursor_agent_api.client.asyncio.create_subprocess_exec')
+    def test_async_iter_stream(self, mock_exec):
+        """Test iter_stream yields events and kills the agent when closed early."""
+        process = _create_async_process(returncode=None, stdout_lines=[
+            _ASSISTANT_HI_LINE,
+            b'{"type": "result", "subtype": "success", "result": "Hi"}\n',
+        ])
+        mock_exec.return_value = process
+        
+        client = AsyncCursorAgentClient()
+        
+        async def run_test():
+            stream = client.iter_stream("Hello")
+            async for event in stream:
+                await stream.aclose()
+                return event
+        
+        event = self.run_async(run_test())
+        
+        self.assertEqual(event.text, "Hi")
+        process.kill.assert_called_once()
     
     @patch.object(CursorAgentClient, 'create_session')
     def test_async_create_session(self, mock_create_session):
         """Test async create session."""
-        import asyncio
-        
         mock_create_session.return_value = "new-session-123"
         
         client = AsyncCursorAgentClient()
@@ -941,12 +1594,12 @@ class TestAsyncCursorAgentClient(unittest.TestCase):
         async def run_test():
             return await client.create_session()
         
-        session_id = asyncio.run(run_test())
+        session_id = self.run_async(run_test())
         
         self.assertEqual(session_id, "new-session-123")
 
 
-class TestAsyncConversationSession(unittest.TestCase):
+class TestAsyncConversationSession(_SharedLoopMixin, unittest.TestCase):
     """Tests for AsyncConversationSession class."""
     
     def test_init_default(self):
@@ -962,8 +1615,6 @@ class TestAsyncConversationSession(unittest.TestCase):
     
     def test_async_send(self):
         """Test async send."""
-        import asyncio
-        
         async def run_test():
             session = AsyncConversationSession()
             
@@ -986,52 +1637,58 @@ class TestAsyncConversationSession(unittest.TestCase):
             self.assertEqual(session.session_id, "sess-123")
             self.assertEqual(len(session._history), 1)
         
-        asyncio.run(run_test())
+        self.run_async(run_test())
+    
+    def test_history_limit(self):
+        """Test history is a read-only view capped at history_limit turns."""
+        session = AsyncConversationSession(history_limit=2)
+        ok = AgentResult(success=True, result="OK", session_id="sess-1")
+        
+        async def mock_query(*args, **kwargs):
+            return ok
+        
+        session.client.query = mock_query
+        history = session.history
+        
+        for prompt in ("one", "two", "three"):
+            self.run_async(session.send(prompt))
+        
+        self.assertFalse(hasattr(history, "append"))
+        self.assertEqual(history, [("two", ok), ("three", ok)])
 
 
-class TestConvenienceFunctions(unittest.TestCase):
+class TestConvenienceFunctions(_SharedLoopMixin, unittest.TestCase):
     """Tests for convenience functions."""
     
-    @patch.object(CursorAgentClient, 'query')
-    def test_query_function(self, mock_query):
+    def test_query_function(self):
         """Test query convenience function."""
-        mock_query.return_value = AgentResult(
-            success=True,
-            result="4",
-            session_id="abc",
-        )
+        expected = AgentResult(success=True, result="4", session_id="abc")
+        _swap_attr(self, CursorAgentClient, "query", lambda client, prompt, **kwargs: expected)
         
         result = query("What is 2+2?")
         
-        self.assertTrue(result.success)
-        self.assertEqual(result.result, "4")
+        self.assertIs(result, expected)
     
-    @patch.object(CursorAgentClient, 'query_stream')
-    def test_query_stream_function(self, mock_query_stream):
+    def test_query_stream_function(self):
         """Test query_stream convenience function."""
-        mock_stream = Mock(spec=StreamingResponse)
-        mock_query_stream.return_value = mock_stream
+        mock_stream = _FakeStream()
+        _swap_attr(self, CursorAgentClient, "query_stream", lambda client, prompt, **kwargs: mock_stream)
         
         result = query_stream("Hello")
         
         self.assertIs(result, mock_stream)
     
-    @patch.object(CursorAgentClient, 'query')
-    def test_aquery_function(self, mock_sync_query):
+    @patch('cursor_agent_api.client.asyncio.create_subprocess_exec')
+    def test_aquery_function(self, mock_exec):
         """Test aquery convenience function."""
-        import asyncio
-        
-        # aquery uses AsyncCursorAgentClient which wraps sync client in executor
-        mock_sync_query.return_value = AgentResult(
-            success=True,
-            result="42",
-            session_id="abc",
+        mock_exec.return_value = _create_async_process(
+            stdout=b'{"type": "result", "subtype": "success", "result": "42", "session_id": "abc"}',
         )
         
         async def run_test():
             return await aquery("What is the answer?")
         
-        result = asyncio.run(run_test())
+        result = self.run_async(run_test())
         
         self.assertTrue(result.success)
         self.assertEqual(result.result, "42")
@@ -1093,11 +1750,255 @@ class TestConvenienceFunctions(unittest.TestCase):
         text = collect_text(events)
         
         self.assertEqual(text, "Hi")
+    
+    def _stream(self, stdout, **kwargs):
+        """Create a client StreamingResponse over canned stdout."""
+        process = Mock()
+        process.stdout = BytesIO(stdout)
+        process.wait.return_value = 0
+        with patch('cursor_agent_api.client.subprocess.Popen', return_value=process):
+            return CursorAgentClient().query_stream("test", **kwargs), process
+    
+    def test_collect_text_streaming_response(self):
+        """Test collect_text reads a client stream without per-delta events."""
+        stream, process = self._stream(
+            b'{"type": "system", "subtype": "init", "session_id": "abc"}\n'
+            b'{"type": "thinking", "subtype": "delta", "text": "hmm"}\n'
+            b'{"type": "assistant", "message": {"content": [{"type": "text", "text": "Hel"}]}, "timestamp_ms": 1}\n'
+            b'not json\n'
+            b'{"type": "assistant", "text": "lo", "timestamp_ms": 2}\n'
+            b'{"type": "assistant", "message": {"content": [{"type": "text", "text": "Hello"}]}}\n'
+            b'{"type": "result", "subtype": "success", "result": "Hello", "session_id": "abc"}\n'
+        )
+        
+        mock_build = stream._event_from_data = Mock(wraps=stream._event_from_data)
+        text = collect_text(stream)
+        
+        self.assertEqual(text, "Hello")
+        # Only the non-delta lines were turned into events
+        self.assertEqual(mock_build.call_count, 3)
+        self.assertEqual(
+            [e.type for e in stream.events],
+            [EventType.SYSTEM_INIT, EventType.RESULT_SUCCESS],
+        )
+        process.wait.assert_called_once()
+    
+    def test_collect_text_streaming_response_with_thinking(self):
+        """Test collect_text includes stream thinking deltas on request."""
+        stream, _ = self._stream(
+            b'{"type": "thinking", "subtype": "delta", "text": "hmm"}\n'
+            b'{"type": "assistant", "text": "Hi", "timestamp_ms": 1}\n'
+        )
+        
+        self.assertEqual(collect_text(stream, include_thinking=True), "[thinking: hmm]Hi")
+    
+    def test_collect_text_streaming_response_result_fallback(self):
+        """Test collect_text uses the stream result when there are no deltas."""
+        stream, _ = self._stream(
+            b'{"type": "result", "subtype": "success", "result": "Final"}\n'
+        )
+        
+        self.assertEqual(collect_text(stream), "Final")
+    
+    def test_collect_text_streaming_response_collect_events(self):
+        """Test collect_events streams still record every event."""
+        stream, _ = self._stream(
+            b'{"type": "assistant", "text": "Hi", "timestamp_ms": 1}\n',
+            collect_events=True,
+        )
+        
+        self.assertEqual(collect_text(stream), "Hi")
+        self.assertEqual([e.type for e in stream.events], [EventType.ASSISTANT_DELTA])
+
+
+class TestPatch(unittest.TestCase):
+    """Tests for the cursor-agent patch helpers."""
+    
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.versions_dir = Path(self._tmp.name) / "versions"
+        self.versions_dir.mkdir()
+        self.offsets_cache = Path(self._tmp.name) / "cache" / "patch_offsets.json"
+        patcher = patch('cursor_agent_api.patch.OFFSETS_CACHE', self.offsets_cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def tearDown(self):
+        self._tmp.cleanup()
+    
+    def _make_version(self, name, mtime):
+        path = self.versions_dir / name
+        path.mkdir()
+        os.utime(path, (mtime, mtime))
+        return path
+    
+    def test_find_latest_version(self):
+        """Test the most recently modified version directory wins."""
+        self._make_version("2024.01.01", 1000)
+        self._make_version("2024.03.01", 3000)
+        self._make_version("2024.02.01", 2000)
+        
+        self.assertEqual(find_latest_version(self.versions_dir), "2024.03.01")
+    
+    def test_find_latest_version_nanoseconds(self):
+        """Test versions a few nanoseconds apart are ordered exactly."""
+        base = 1_700_000_000_000_000_000
+        for name, mtime_ns in (("a", base + 2), ("b", base + 3), ("c", base + 1)):
+            path = self.versions_dir / name
+            path.mkdir()
+            os.utime(path, ns=(mtime_ns, mtime_ns))
+        
+        self.assertEqual(find_latest_version(self.versions_dir), "b")
+    
+    def test_find_latest_version_empty(self):
+        """Test an empty versions directory raises FileNotFoundError."""
+        with self.assertRaises(FileNotFoundError):
+            find_latest_version(self.versions_dir)
+    
+    def _patch(self, content=None, dry_run=False):
+        """Run patch_cursor_agent against a fake versions directory."""
+        index_js = self.versions_dir / "2024.01.01" / "index.js"
+        if content is not None:
+            self._make_version("2024.01.01", 1000)
+            index_js.write_text(content, encoding="utf-8")
+        with patch('cursor_agent_api.patch.find_cursor_agent_dir', return_value=self.versions_dir), \
+             patch('sys.stdout', new_callable=StringIO):
+            applied = patch_cursor_agent(dry_run=dry_run)
+        return applied, index_js
+    
+    def test_patch_cursor_agent(self):
+        """Test the flag is enabled and a backup of the original is kept."""
+        original = "var a=1;enableRunEverything = false;var b=2;"
+        applied, index_js = self._patch(original)
+        
+        self.assertTrue(applied)
+        self.assertEqual(index_js.read_text(), "var a=1;enableRunEverything = true;var b=2;")
+        self.assertEqual(index_js.with_suffix(".js.bak").read_text(), original)
+        self.assertEqual(sorted(os.listdir(index_js.parent)), ["index.js", "index.js.bak"])
+    
+    def test_patch_cursor_agent_backup_without_hard_links(self):
+        """Test the backup falls back to a copy when hard links fail."""
+        original = "enableRunEverything = false;"
+        with patch('cursor_agent_api.patch.os.link', side_effect=OSError):
+            applied, index_js = self._patch(original)
+        
+        self.assertTrue(applied)
+        self.assertEqual(index_js.with_suffix(".js.bak").read_text(), original)
+    
+    def test_patch_cursor_agent_failed_write_keeps_original(self):
+        """Test a failed write leaves index.js intact and no temp file."""
+        original = "enableRunEverything = false;"
+        with patch('cursor_agent_api.patch.os.fsync', side_effect=OSError("disk full")):
+            applied, index_js = self._patch(original)
+        
+        self.assertFalse(applied)
+        self.assertEqual(index_js.read_text(), original)
+        self.assertEqual(sorted(os.listdir(index_js.parent)), ["index.js", "index.js.bak"])
+    
+    def test_patch_cursor_agent_already_patched(self):
+        """Test an already patched file is left untouched."""
+        applied, index_js = self._patch("enableRunEverything = true;")
+        
+        self.assertFalse(applied)
+        self.assertFalse(index_js.with_suffix(".js.bak").exists())
+    
+    def test_patch_cursor_agent_pattern_missing(self):
+        """Test a file without the flag is not patched."""
+        applied, index_js = self._patch("var a=1;")
+        
+        self.assertFalse(applied)
+        self.assertEqual(index_js.read_text(), "var a=1;")
+    
+    def test_patch_cursor_agent_empty_file(self):
+        """Test an empty index.js is reported as missing the pattern."""
+        applied, index_js = self._patch("")
+        
+        self.assertFalse(applied)
+    
+    def test_patch_cursor_agent_replaces_every_occurrence(self):
+        """Test every disabled flag in the bundle is enabled."""
+        applied, index_js = self._patch(
+            "enableRunEverything = false;\u00e9;enableRunEverything = false;"
+        )
+        
+        self.assertTrue(applied)
+        self.assertEqual(
+            index_js.read_text(encoding="utf-8"),
+            "enableRunEverything = true;\u00e9;enableRunEverything = true;",
+        )
+    
+    def test_patch_cursor_agent_enabled_after_disabled(self):
+        """Test an enabled flag anywhere in the file counts as patched."""
+        applied, index_js = self._patch(
+            "enableRunEverything = false;enableRunEverything = x;enableRunEverything = true;"
+        )
+        
+        self.assertFalse(applied)
+    
+    @patch('cursor_agent_api.patch._scan_flag', wraps=patch_module._scan_flag)
+    def test_patch_cursor_agent_reuses_cached_offsets(self, mock_scan):
+        """Test an unchanged index.js is not rescanned on the next run."""
+        self._patch("var a=1;enableRunEverything = false;", dry_run=True)
+        self.assertTrue(self.offsets_cache.exists())
+        self.assertEqual(mock_scan.call_count, 1)
+        
+        applied, index_js = self._patch(dry_run=True)
+        self.assertTrue(applied)
+        self.assertEqual(mock_scan.call_count, 1)
+        
+        applied, index_js = self._patch()
+        self.assertTrue(applied)
+        self.assertEqual(mock_scan.call_count, 1)
+        
+        # The cache is refreshed for the patched file
+        applied, index_js = self._patch()
+        self.assertFalse(applied)
+        self.assertEqual(mock_scan.call_count, 1)
+    
+    @patch('cursor_agent_api.patch._scan_flag', wraps=patch_module._scan_flag)
+    def test_patch_cursor_agent_rescans_changed_file(self, mock_scan):
+        """Test a modified index.js invalidates the cached offsets."""
+        self._patch("enableRunEverything = false;", dry_run=True)
+        
+        index_js = self.versions_dir / "2024.01.01" / "index.js"
+        index_js.write_text("var a=1;enableRunEverything = true;")
+        applied, index_js = self._patch()
+        
+        self.assertFalse(applied)
+        self.assertEqual(mock_scan.call_count, 2)
+    
+    def test_patch_cursor_agent_ignores_corrupt_cache(self):
+        """Test an unreadable offsets cache falls back to a full scan."""
+        self.offsets_cache.parent.mkdir()
+        self.offsets_cache.write_text("not json")
+        
+        applied, index_js = self._patch("enableRunEverything = false;")
+        
+        self.assertTrue(applied)
+        self.assertEqual(index_js.read_text(), "enableRunEverything = true;")
+    
+    def test_patch_cursor_agent_dry_run(self):
+        """Test dry run reports the patch without writing."""
+        applied, index_js = self._patch("enableRunEverything = false;", dry_run=True)
+        
+        self.assertTrue(applied)
+        self.assertEqual(index_js.read_text(), "enableRunEverything = false;")
+        self.assertFalse(index_js.with_suffix(".js.bak").exists())
 
 
 class TestEdgeCases(unittest.TestCase):
     """Tests for edge cases and error handling."""
     
+    _IS_ERROR_STDOUT = (
+        b'{"type": "result", "subtype": "success", "result": "ok", "session_id": "abc",'
+        b' "is_error": true, "error": "warning"}'
+    )
+    
+    @classmethod
+    def setUpClass(cls):
+        # The _parse_event tests only call pure methods, so they share one
+        cls.default_client = CursorAgentClient()
+    
     def test_agent_result_with_is_error_field(self):
         """Test parsing result with is_error field."""
         client = CursorAgentClient()
@@ -1105,8 +2006,8 @@ class TestEdgeCases(unittest.TestCase):
         with patch('cursor_agent_api.client.subprocess.run') as mock_run:
             mock_run.return_value = Mock(
                 returncode=0,
-                stdout='{"type": "result", "subtype": "success", "result": "ok", "session_id": "abc", "is_error": true, "error": "warning"}',
-                stderr='',
+                stdout=self._IS_ERROR_STDOUT,
+                stderr=b'',
             )
             
             result = client.query("test")
@@ -1116,7 +2017,7 @@ class TestEdgeCases(unittest.TestCase):
     
     def test_parse_event_with_empty_content_array(self):
         """Test parsing event with empty content array."""
-        client = CursorAgentClient()
+        client = self.default_client
         line = '{"type": "assistant", "message": {"content": []}}'
         
         event = client._parse_event(line)
@@ -1126,7 +2027,7 @@ class TestEdgeCases(unittest.TestCase):
     
     def test_parse_event_with_non_text_content(self):
         """Test parsing event with non-text content type."""
-        client = CursorAgentClient()
+        client = self.default_client
         line = '{"type": "assistant", "message": {"content": [{"type": "image", "url": "http://example.com"}]}}'
         
         event = client._parse_event(line)
@@ -1136,7 +2037,7 @@ class TestEdgeCases(unittest.TestCase):
     
     def test_parse_event_with_non_dict_message(self):
         """Test parsing event where message is not a dict."""
-        client = CursorAgentClient()
+        client = self.default_client
         line = '{"type": "user", "message": "just a string"}'
         
         event = client._parse_event(line)
@@ -1146,10 +2047,7 @@ class TestEdgeCases(unittest.TestCase):
     
     def test_streaming_response_no_stdout(self):
         """Test StreamingResponse when stdout is None."""
-        process = Mock(spec=subprocess.Popen)
-        process.stdout = None
-        process.poll.return_value = 0
-        process.wait.return_value = 0
+        process = _FakePopen(stdout=None, poll=0)
         
         stream = StreamingResponse(process, lambda x: None)
         events = list(stream)
@@ -1160,21 +2058,7 @@ class TestEdgeCases(unittest.TestCase):
 def run_tests():
     """Run all tests."""
     loader = unittest.TestLoader()
-    suite = unittest.TestSuite()
-    
-    # Add all test classes
-    suite.addTests(loader.loadTestsFromTestCase(TestOutputFormat))
-    suite.addTests(loader.loadTestsFromTestCase(TestEventType))
-    suite.addTests(loader.loadTestsFromTestCase(TestAgentConfig))
-    suite.addTests(loader.loadTestsFromTestCase(TestAgentEvent))
-    suite.addTests(loader.loadTestsFromTestCase(TestAgentResult))
-    suite.addTests(loader.loadTestsFromTestCase(TestStreamingResponse))
-    suite.addTests(loader.loadTestsFromTestCase(TestCursorAgentClient))
-    suite.addTests(loader.loadTestsFromTestCase(TestConversationSession))
-    suite.addTests(loader.loadTestsFromTestCase(TestAsyncCursorAgentClient))
-    suite.addTests(loader.loadTestsFromTestCase(TestAsyncConversationSession))
-    suite.addTests(loader.loadTestsFromTestCase(TestConvenienceFunctions))
-    suite.addTests(loader.loadTestsFromTestCase(TestEdgeCases))
+    suite = loader.loadTestsFromModule(sys.modules[__name__])
     
     runner = unittest.TextTestRunner(verbosity=2)
     result = runner.run(suite)
@@ -1183,5 +2067,4 @@ def run_tests():
 
 
 if __name__ == "__main__":
-    import sys
     sys.exit(run_tests())